@@ -1,20 +1,16 @@
 import cv2 as cv
 import numpy as np
 
+from depth.rectify import StereoRectifier
+
 # Load the images
 left_image = cv.imread("left_cam.png", cv.IMREAD_GRAYSCALE)
 right_image = cv.imread("right_cam.png", cv.IMREAD_GRAYSCALE)
 
-# Define translation offsets (tweak these values based on observed misalignment)
-x_offset = -325  # Positive: Move right; Negative: Move left
-y_offset = 63 # Positive: Move down; Negative: Move up
-
-# Create the translation matrix
+# Rectify with the stereo calibration instead of hand-tuned translation offsets
 rows, cols = right_image.shape
-translation_matrix = np.float32([[1, 0, x_offset], [0, 1, y_offset]])
-
-# Apply the translation to align the left image
-aligned_left = cv.warpAffine(left_image, translation_matrix, (cols, rows))
+rectifier = StereoRectifier.from_file((cols, rows))
+aligned_left, right_image = rectifier.rectify(left_image, right_image)
 
 # Verify alignment by overlaying the images
 overlay = cv.addWeighted(aligned_left, 0.5, right_image, 0.5, 0)
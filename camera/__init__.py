@@ -0,0 +1,5 @@
+from .capture import CaptureThread, FrameRing
+from .manager import CameraManager
+from .fake import FakeCapture
+
+__all__ = ["CaptureThread", "FrameRing", "CameraManager", "FakeCapture"]
@@ -0,0 +1,205 @@
+import threading
+import time
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    """
+    Fixed-size ring of preallocated frame buffers that always exposes the newest frame.
+
+    The ring is written by exactly one producer and read by exactly one consumer. Neither
+    side takes a lock: the producer never writes into the slot that is currently published
+    or claimed by the consumer, so with three slots there is always a free one to fill.
+    Frames that are overwritten before the consumer gets to them are counted as dropped.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, slots=3):
+        if slots < 3:
+            raise ValueError("FrameRing needs at least 3 slots")
+
+        self.shape = tuple(shape)
+        self.buffers = [np.empty(self.shape, dtype=dtype) for _ in range(slots)]
+        self.timestamps = [0.0] * slots
+        self.sequences = [0] * slots
+
+        self._latest = -1   # Slot holding the newest published frame
+        self._reading = -1  # Slot currently claimed by the consumer
+        self._published = 0
+        self._consumed = 0
+
+        # Counters
+        self.dropped = 0
+        self.delivered = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def acquire_write_slot(self) -> int:
+        """Return the index of a slot the producer may overwrite."""
+        latest = self._latest
+        reading = self._reading
+        for index in range(len(self.buffers)):
+            if index != latest and index != reading:
+                return index
+        raise RuntimeError("No free slot in FrameRing")
+
+    def publish(self, index: int, timestamp: float) -> None:
+        """Publish a filled slot as the newest frame."""
+        # The previous frame was never picked up by the consumer
+        if self._published > self._consumed:
+            self.dropped += 1
+
+        self._published += 1
+        self.timestamps[index] = timestamp
+        self.sequences[index] = self._published
+        self._latest = index
+
+    def latest(self):
+        """
+        Return (frame, sequence) for the newest unseen frame, or (None, 0) if there is none.
+
+        Never blocks. The returned array is a view into the ring and stays valid until the
+        next call to latest().
+        """
+        for _ in range(len(self.buffers)):
+            index = self._latest
+            if index < 0 or self.sequences[index] <= self._consumed:
+                return None, 0
+
+            # Claim the slot, then make sure it was not republished in between
+            self._reading = index
+            if self._latest != index:
+                continue
+
+            sequence = self.sequences[index]
+            self._consumed = sequence
+            self.delivered += 1
+
+            latency = time.perf_counter() - self.timestamps[index]
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+
+            return self.buffers[index], sequence
+
+        return None, 0
+
+    def stats(self) -> dict:
+        """Return delivery counters and latency figures in milliseconds."""
+        average = self.total_latency / self.delivered if self.delivered else 0.0
+        return {
+            "captured": self._published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "latency_ms": self.last_latency * 1000,
+            "avg_latency_ms": average * 1000,
+            "max_latency_ms": self.max_latency * 1000,
+        }
+
+
+READ_RETRY_DELAY = 0.01  # First wait after a failed read; doubles up to READ_RETRY_MAX_DELAY
+READ_RETRY_MAX_DELAY = 0.5
+
+
+class CaptureThread(threading.Thread):
+    """Background producer that owns a cv2.VideoCapture and fills a FrameRing."""
+
+    def __init__(self, camera_index=0, slots=3, open_capture=cv2.VideoCapture, release_on_stop=True):
+        super().__init__(name=f"capture-{camera_index}", daemon=True)
+        self.camera_index = camera_index
+        self.slots = slots
+        self.open_capture = open_capture
+        self.release_on_stop = release_on_stop  # False when the device is shared with a CameraManager
+
+        self.ring = None
+        self.failed_reads = 0
+        self._running = threading.Event()
+        self._ready = threading.Event()
+
+    def start(self):
+        self._running.set()
+        super().start()
+
+    def run(self):
+        camera = self.open_capture(self.camera_index)
+        if not camera.isOpened():
+            print(f"Error: Could not access the camera at index {self.camera_index}.")
+            self._running.clear()
+            self._ready.set()
+            return
+
+        retry_delay = READ_RETRY_DELAY
+        try:
+            while self._running.is_set():
+                if self.ring is None:
+                    ret, frame = camera.read()
+                    if not ret:
+                        self.failed_reads += 1
+                        retry_delay = self._back_off(retry_delay)
+                        continue
+
+                    # Size the ring from the first frame the device hands back
+                    self.ring = FrameRing(frame.shape, frame.dtype, self.slots)
+                    index = self.ring.acquire_write_slot()
+                    self.ring.buffers[index][...] = frame
+                    self.ring.publish(index, time.perf_counter())
+                    self._ready.set()
+                    retry_delay = READ_RETRY_DELAY
+                    continue
+
+                index = self.ring.acquire_write_slot()
+                buffer = self.ring.buffers[index]
+
+                # Decode straight into the preallocated slot
+                ret, frame = camera.read(buffer)
+                if not ret:
+                    self.failed_reads += 1
+                    retry_delay = self._back_off(retry_delay)
+                    continue
+                retry_delay = READ_RETRY_DELAY
+
+                if frame is not buffer:
+                    if frame.shape != buffer.shape:
+                        # The device changed resolution; start a new ring
+                        self.ring = None
+                        continue
+                    buffer[...] = frame
+
+                self.ring.publish(index, time.perf_counter())
+        finally:
+            if self.release_on_stop:
+                camera.release()
+
+    def _back_off(self, delay):
+        """Wait after a failed read (unplugged or busy device) instead of spinning; returns the next delay."""
+        # Sleep in short steps so stop() stays prompt
+        deadline = time.perf_counter() + delay
+        while self._running.is_set() and time.perf_counter() < deadline:
+            time.sleep(min(0.05, deadline - time.perf_counter()))
+        return min(delay * 2, READ_RETRY_MAX_DELAY)
+
+    def wait_ready(self, timeout=None) -> bool:
+        """Block until the first frame has been captured or the device failed to open."""
+        self._ready.wait(timeout)
+        return self.ring is not None
+
+    def latest(self):
+        """Return the newest unseen frame or None. Never blocks."""
+        ring = self.ring
+        if ring is None:
+            return None
+        frame, _ = ring.latest()
+        return frame
+
+    def stats(self) -> dict:
+        """Return ring counters plus the number of failed device reads."""
+        stats = self.ring.stats() if self.ring is not None else {}
+        stats["failed_reads"] = self.failed_reads
+        return stats
+
+    def stop(self, timeout=2.0):
+        """Stop the producer and release the device if this thread owns it."""
+        self._running.clear()
+        if self.is_alive():
+            self.join(timeout)
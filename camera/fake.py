@@ -0,0 +1,95 @@
+import glob
+import os
+import time
+import cv2
+import numpy as np
+
+TEST_IMAGES_DIRECTORY = "test_images"
+
+
+class FakeCapture:
+    """
+    Stand-in for cv2.VideoCapture that replays a list of frames in a loop.
+
+    Implements the subset of the VideoCapture API the camera code relies on
+    (isOpened, read, grab, retrieve, release, get, set) so capture paths can be
+    exercised without hardware.
+    """
+
+    def __init__(self, frames, fps=30.0):
+        if not frames:
+            raise ValueError("FakeCapture needs at least one frame")
+
+        self.frames = frames
+        self.fps = fps
+        self.index = 0
+        self.opened = True
+        self._grabbed = None
+        self._last_grab = 0.0
+
+    @classmethod
+    def from_files(cls, paths, fps=30.0):
+        """Replay the given image files."""
+        return cls([cv2.imread(path) for path in paths], fps)
+
+    @classmethod
+    def from_stereo_pairs(cls, directory=TEST_IMAGES_DIRECTORY, fps=30.0):
+        """Replay side-by-side frames built from left_image*/right_image* pairs."""
+        frames = []
+        for left_path in sorted(glob.glob(os.path.join(directory, "left_image*.png"))):
+            right_path = left_path.replace("left_image", "right_image")
+            if os.path.exists(right_path):
+                frames.append(np.hstack([cv2.imread(left_path), cv2.imread(right_path)]))
+        return cls(frames, fps)
+
+    @classmethod
+    def from_directory(cls, directory=TEST_IMAGES_DIRECTORY, fps=30.0):
+        """Replay every PNG in a directory."""
+        return cls.from_files(sorted(glob.glob(os.path.join(directory, "*.png"))), fps)
+
+    def isOpened(self):
+        return self.opened
+
+    def grab(self):
+        if not self.opened:
+            return False
+
+        # Pace frames like a real device would
+        if self.fps:
+            wait = self._last_grab + 1.0 / self.fps - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        self._last_grab = time.perf_counter()
+
+        self._grabbed = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+        return True
+
+    def retrieve(self, image=None):
+        if self._grabbed is None:
+            return False, None
+        if image is not None and image.shape == self._grabbed.shape:
+            image[...] = self._grabbed
+            return True, image
+        return True, self._grabbed.copy()
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.frames[0].shape[1])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.frames[0].shape[0])
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def set(self, prop_id, value):
+        return False
+
+    def release(self):
+        self.opened = False
+        self._grabbed = None
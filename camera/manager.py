@@ -0,0 +1,141 @@
+import threading
+import time
+import cv2
+
+from camera.capture import CaptureThread
+
+
+class CameraManager:
+    """
+    Keeps every configured camera open for the lifetime of the app.
+
+    Devices are opened once and shared: the preview device is handed to a
+    CaptureThread, while stills are served from the already-open stereo device
+    with grab()/retrieve(), so taking a picture never tears down the preview.
+    """
+
+    def __init__(self, devices, open_capture=cv2.VideoCapture, stale_frames=1):
+        """
+        Args:
+            devices (dict): Device name -> camera index, e.g. {"preview": 0, "stereo": 2}.
+            open_capture (callable): Factory taking a camera index (cv2.VideoCapture or a fake).
+            stale_frames (int): Buffered frames to drop before retrieving a still.
+        """
+        self.devices = dict(devices)
+        self.open_capture = open_capture
+        self.stale_frames = stale_frames
+
+        self.handles = {}
+        self.locks = {name: threading.Lock() for name in self.devices}
+        self.still_stats = {name: _StillStats() for name in self.devices}
+
+    def open(self):
+        """Open every configured device that is not open yet."""
+        for name in self.devices:
+            self.handle(name)
+        return self
+
+    def handle(self, name):
+        """Return the capture handle for `name`, (re)opening it if it is not open."""
+        camera = self.handles.get(name)
+        if camera is None or not camera.isOpened():
+            camera = self.open_capture(self.devices[name])
+            if not camera.isOpened():
+                print(f"Error: Could not access the {name} camera at index {self.devices[name]}.")
+            self.handles[name] = camera
+        return camera
+
+    def preview_stream(self, name="preview", slots=3):
+        """Start a CaptureThread on the already-open device `name`."""
+        stream = CaptureThread(self.devices[name], slots=slots,
+                               open_capture=lambda index: self.handle(name),
+                               release_on_stop=False)
+        stream.start()
+        return stream
+
+    def capture_still(self, name="stereo", out=None):
+        """
+        Grab and decode one fresh frame from the open device `name`.
+
+        Returns the frame, or None if the device failed to deliver one.
+        """
+        stats = self.still_stats[name]
+        with self.locks[name]:
+            start = time.perf_counter()
+            camera = self.handle(name)
+            if not camera.isOpened():
+                stats.failures += 1
+                return None
+
+            # Drop frames the driver buffered while nobody was reading
+            for _ in range(self.stale_frames):
+                camera.grab()
+
+            if not camera.grab():
+                stats.failures += 1
+                return None
+            ret, frame = camera.retrieve(out) if out is not None else camera.retrieve()
+            if not ret:
+                stats.failures += 1
+                return None
+
+            stats.record(start, time.perf_counter())
+            return frame
+
+    def stats(self) -> dict:
+        """Return per-device still capture metrics."""
+        return {name: stats.as_dict() for name, stats in self.still_stats.items()}
+
+    def release(self):
+        """Release every open device."""
+        for camera in self.handles.values():
+            camera.release()
+        self.handles.clear()
+
+
+class _StillStats:
+    """Capture and shot-to-shot latency for one device."""
+
+    def __init__(self):
+        self.shots = 0
+        self.failures = 0
+        self.last_capture = 0.0
+        self.total_capture = 0.0
+        self.last_shot_to_shot = 0.0
+        self._last_shot = None
+
+    def record(self, start, end):
+        if self._last_shot is not None:
+            self.last_shot_to_shot = end - self._last_shot
+        self._last_shot = end
+        self.last_capture = end - start
+        self.total_capture += self.last_capture
+        self.shots += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "shots": self.shots,
+            "failures": self.failures,
+            "capture_ms": self.last_capture * 1000,
+            "avg_capture_ms": self.total_capture / self.shots * 1000 if self.shots else 0.0,
+            "shot_to_shot_ms": self.last_shot_to_shot * 1000,
+        }
+
+
+if __name__ == "__main__":
+    # Exercise the manager against replayed test images instead of real hardware
+    from camera.fake import FakeCapture
+
+    fakes = {0: FakeCapture.from_files(["test_images/right_image.png"]), 2: FakeCapture.from_stereo_pairs()}
+    manager = CameraManager({"preview": 0, "stereo": 2}, open_capture=lambda index: fakes[index]).open()
+
+    preview = manager.preview_stream()
+    preview.wait_ready(2.0)
+    for _ in range(3):
+        frame = manager.capture_still()
+        print(f"Still {frame.shape}, preview alive: {preview.is_alive()}")
+
+    preview.stop()
+    print(f"Stills: {manager.stats()}")
+    print(f"Preview: {preview.stats()}")
+    manager.release()
@@ -0,0 +1,9 @@
+from .matcher import PRESETS, StereoParams, compute_disparity, get_matcher
+from .rectify import StereoRectifier
+from .conversion import DepthConverter, DepthQuantizer
+from .engine import DepthEngine, DepthResult
+
+__all__ = [
+    "PRESETS", "StereoParams", "compute_disparity", "get_matcher", "StereoRectifier",
+    "DepthConverter", "DepthQuantizer", "DepthEngine", "DepthResult",
+]
@@ -0,0 +1,107 @@
+import numpy as np
+
+
+class DepthConverter:
+    """
+    Disparity (pixels) to metric depth using depth = focal_length * baseline / disparity.
+
+    Pixels with no usable disparity are reported through an explicit validity mask and
+    set to 0 in the depth map, instead of being given a fake disparity of 1.
+    """
+
+    def __init__(self, focal_length, baseline, min_disparity=0.0):
+        """
+        Args:
+            focal_length (float): Rectified focal length in pixels.
+            baseline (float): Distance between the cameras in metres.
+            min_disparity (float): Disparities at or below this are invalid.
+        """
+        self.focal_length = float(focal_length)
+        self.baseline = float(baseline)
+        self.min_disparity = float(min_disparity)
+        self._depth = None
+        self._valid = None
+
+    @classmethod
+    def from_rectifier(cls, rectifier, min_disparity=0.0):
+        return cls(rectifier.focal_length, rectifier.baseline, min_disparity)
+
+    def convert(self, disparity, depth_out=None, valid_out=None):
+        """
+        Return (depth, valid): float32 metres and a boolean mask of trustworthy pixels.
+
+        Without explicit output arrays the converter's own buffers are reused, so the
+        results are overwritten by the next call.
+        """
+        if depth_out is None or valid_out is None:
+            if self._depth is None or self._depth.shape != disparity.shape:
+                self._depth = np.empty(disparity.shape, dtype=np.float32)
+                self._valid = np.empty(disparity.shape, dtype=bool)
+            depth_out = self._depth if depth_out is None else depth_out
+            valid_out = self._valid if valid_out is None else valid_out
+
+        np.greater(disparity, self.min_disparity, out=valid_out)
+        depth_out.fill(0)
+        np.divide(self.focal_length * self.baseline, disparity, out=depth_out, where=valid_out)
+        return depth_out, valid_out
+
+    def to_millimetres(self, depth, valid, out=None):
+        """Encode metric depth as uint16 millimetres; 0 marks invalid or out-of-range pixels."""
+        if out is None:
+            out = np.empty(depth.shape, dtype=np.uint16)
+        millimetres = np.multiply(depth, 1000.0)
+        np.rint(millimetres, out=millimetres)
+        # Beyond 65.535 m cannot be represented; mark it invalid rather than clamp it
+        out_of_range = millimetres > np.iinfo(np.uint16).max
+        np.clip(millimetres, 0, np.iinfo(np.uint16).max, out=millimetres)
+        out[...] = millimetres
+        out[~valid | out_of_range] = 0
+        return out
+
+
+class DepthQuantizer:
+    """
+    Fixed-range linear quantizer so stored depth means the same thing in every shot.
+
+    Depths in [near, far] metres map to codes 1..max; `invalid_value` (0) marks pixels
+    with no depth. Values outside the range are clamped.
+    """
+
+    def __init__(self, near=0.3, far=10.0, dtype=np.uint8, invalid_value=0):
+        if far <= near:
+            raise ValueError("far must be greater than near")
+
+        self.near = float(near)
+        self.far = float(far)
+        self.dtype = np.dtype(dtype)
+        self.invalid_value = invalid_value
+
+        max_code = np.iinfo(self.dtype).max
+        self.min_code = 1 if invalid_value == 0 else 0
+        self.max_code = max_code if invalid_value != max_code else max_code - 1
+
+        # code = (depth - offset) / scale + min_code
+        self.scale = (self.far - self.near) / (self.max_code - self.min_code)
+        self.offset = self.near
+
+    def quantize(self, depth, valid, out=None):
+        """Return `depth` (metres) as fixed-range codes of `dtype`."""
+        # Per-call scratch: one quantizer is shared by the GUI's processing workers
+        scratch = np.empty(depth.shape, dtype=np.float32)
+
+        np.clip(depth, self.near, self.far, out=scratch)
+        np.subtract(scratch, self.offset, out=scratch)
+        np.multiply(scratch, 1.0 / self.scale, out=scratch)
+        np.add(scratch, self.min_code + 0.5, out=scratch)  # Round to the nearest code
+
+        if out is None:
+            out = np.empty(depth.shape, dtype=self.dtype)
+        np.copyto(out, scratch, casting="unsafe")
+        np.copyto(out, self.invalid_value, where=~valid)
+        return out
+
+    def dequantize(self, codes):
+        """Return float32 metres, with NaN where the code is `invalid_value`."""
+        depth = (codes.astype(np.float32) - self.min_code) * self.scale + self.offset
+        depth[codes == self.invalid_value] = np.nan
+        return depth
@@ -0,0 +1,301 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+from depth.conversion import DepthConverter
+from depth.matcher import compute_disparity, get_matcher, resolve_params
+from depth.rectify import MAX_NUM_DISPARITIES
+
+# Uncalibrated fallbacks, only used when no rectifier is available
+FOCAL_LENGTH = 1000
+BASELINE = 0.6
+
+
+def _depth_worker(conn, input_name, output_name, max_shape, params, focal_length, baseline, cv_threads, rectifier):
+    """Worker process loop: build the default matcher once, then serve (shape, params) requests."""
+    if cv_threads is not None:
+        cv2.setNumThreads(cv_threads)
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    max_pixels = max_shape[0] * max_shape[1]
+
+    get_matcher(params)  # Warm the cache; other presets are built on first use
+    converter = DepthConverter(focal_length, baseline)
+
+    try:
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+
+            (height, width), request_params = request
+            pixels = height * width
+            try:
+                left = np.ndarray((height, width), np.uint8, input_shm.buf, 0)
+                right = np.ndarray((height, width), np.uint8, input_shm.buf, max_pixels)
+                disparity = np.ndarray((height, width), np.float32, output_shm.buf, 0)
+                depth = np.ndarray((height, width), np.float32, output_shm.buf, max_pixels * 4)
+                valid = np.ndarray((height, width), np.bool_, output_shm.buf, max_pixels * 8)
+
+                if rectifier is not None:
+                    left, right = rectifier.rectify(left, right)
+
+                compute_disparity(left, right, request_params or params, out=disparity)
+                converter.convert(disparity, depth_out=depth, valid_out=valid)
+
+                conn.send(pixels)
+            except Exception as e:
+                conn.send(e)
+            finally:
+                del left, right, disparity, depth, valid
+    finally:
+        input_shm.close()
+        output_shm.close()
+
+
+class DepthResult:
+    """
+    Disparity, metric depth and validity arrays living in a worker's shared memory.
+
+    `depth` is float32 metres and is 0 wherever `valid` is False.
+
+    The arrays are views, not copies, and stay valid until release() is called
+    (or the with-block exits); after that the worker may overwrite them.
+    """
+
+    def __init__(self, engine, worker, shape):
+        self._engine = engine
+        self._worker = worker
+        height, width = shape
+        max_pixels = worker.max_pixels
+        self.disparity = np.ndarray((height, width), np.float32, worker.output_shm.buf, 0)
+        self.depth = np.ndarray((height, width), np.float32, worker.output_shm.buf, max_pixels * 4)
+        self.valid = np.ndarray((height, width), np.bool_, worker.output_shm.buf, max_pixels * 8)
+
+    def release(self):
+        if self._worker is not None:
+            self.disparity = None
+            self.depth = None
+            self.valid = None
+            self._engine._idle.put(self._worker)
+            self._worker = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Worker:
+    """Parent-side handle for one worker process and its shared memory slot."""
+
+    def __init__(self, context, max_shape, params, focal_length, baseline, cv_threads, rectifier):
+        self.max_shape = max_shape
+        self.max_pixels = max_shape[0] * max_shape[1]
+
+        # Input: left + right uint8 planes. Output: disparity + depth float32 planes, valid mask.
+        self.input_shm = shared_memory.SharedMemory(create=True, size=self.max_pixels * 2)
+        self.output_shm = shared_memory.SharedMemory(create=True, size=self.max_pixels * (4 * 2 + 1))
+
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_depth_worker,
+            args=(child_conn, self.input_shm.name, self.output_shm.name, max_shape,
+                  params, focal_length, baseline, cv_threads, rectifier),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def planes(self, shape):
+        height, width = shape
+        left = np.ndarray((height, width), np.uint8, self.input_shm.buf, 0)
+        right = np.ndarray((height, width), np.uint8, self.input_shm.buf, self.max_pixels)
+        return left, right
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.input_shm.close()
+        self.input_shm.unlink()
+        self.output_shm.close()
+        self.output_shm.unlink()
+
+
+class DepthEngine:
+    """
+    Runs StereoSGBM in worker processes, outside the GUI process and its GIL.
+
+    Each worker owns a shared memory slot sized for `max_shape` stereo halves. Frames
+    are converted to grayscale straight into that slot (no pickling), the worker
+    computes disparity and depth with a matcher it built once at startup, and the
+    result comes back as views of the worker's output memory.
+    """
+
+    def __init__(self, workers=1, max_shape=(1520, 1920), params=None,
+                 focal_length=None, baseline=None, cv_threads=None, rectifier=None,
+                 start_method=None, min_depth=None, max_disparities=MAX_NUM_DISPARITIES):
+        """
+        Args:
+            workers (int): Number of worker processes (one matcher each).
+            max_shape (tuple): Largest (height, width) of one stereo half.
+            params (StereoParams or str): Default matcher settings or preset name.
+            cv_threads (int): OpenCV threads per worker; 1 keeps workers from oversubscribing cores.
+            rectifier (StereoRectifier): Rectify every pair before matching, if given.
+            focal_length, baseline (float): Override the rectifier's calibrated values.
+            start_method (str): multiprocessing start method, platform default if None.
+            min_depth (float): Nearest distance in metres that must be matched. With a
+                rectifier, a preset whose disparity search range reaches closer than that
+                is narrowed to what min_depth needs; ranges are never widened.
+            max_disparities (int): Upper bound on the calibrated range.
+        """
+        if focal_length is None:
+            focal_length = rectifier.focal_length if rectifier is not None else FOCAL_LENGTH
+        if baseline is None:
+            baseline = rectifier.baseline if rectifier is not None else BASELINE
+
+        context = mp.get_context(start_method)
+        self.max_shape = tuple(max_shape)
+        self.rectifier = rectifier
+        self.min_depth = min_depth
+        self.max_disparities = max_disparities
+        self.params = self._fit_params(resolve_params(params))
+        # Kept so a worker that dies can be replaced with an identical one
+        self._worker_args = (context, self.max_shape, self.params, focal_length, baseline, cv_threads, rectifier)
+        self._workers_lock = threading.Lock()
+        self._workers = [_Worker(*self._worker_args) for _ in range(workers)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="depth-engine")
+        self._closed = False
+
+    def compute(self, left, right, params=None, timeout=None) -> DepthResult:
+        """
+        Compute disparity/depth for one stereo pair (BGR or grayscale), blocking until done.
+
+        `params` (StereoParams or preset name) overrides the engine default for this pair.
+        Release the returned DepthResult to hand the worker back to the pool.
+        """
+        if left.shape[:2] != right.shape[:2]:
+            raise ValueError("Left and right images must have the same dimensions")
+        shape = left.shape[:2]
+        if shape[0] > self.max_shape[0] or shape[1] > self.max_shape[1]:
+            raise ValueError(f"Stereo pair {shape} exceeds engine max shape {self.max_shape}")
+
+        worker = self._idle.get(timeout=timeout)
+        try:
+            left_plane, right_plane = worker.planes(shape)
+            _to_gray(left, left_plane)
+            _to_gray(right, right_plane)
+            del left_plane, right_plane
+            request_params = self._fit_params(resolve_params(params)) if params is not None else None
+        except BaseException:
+            self._idle.put(worker)
+            raise
+
+        try:
+            worker.conn.send((shape, request_params))
+            reply = worker.conn.recv()
+        except BaseException as e:
+            # The process died or the exchange was cut off mid-request, so the pipe
+            # can no longer be trusted: replace the worker instead of reusing it
+            self._replace_worker(worker)
+            if isinstance(e, (EOFError, OSError)):
+                raise RuntimeError(f"Depth worker exited unexpectedly ({e!r}); it has been restarted") from e
+            raise
+
+        if isinstance(reply, Exception):
+            self._idle.put(worker)
+            raise reply
+        return DepthResult(self, worker, shape)
+
+    def _replace_worker(self, worker):
+        """Shut down a broken worker and put a freshly started one in the pool."""
+        worker.close()
+        with self._workers_lock:
+            self._workers.remove(worker)
+            if self._closed:
+                return
+            replacement = _Worker(*self._worker_args)
+            self._workers.append(replacement)
+        self._idle.put(replacement)
+
+    def _fit_params(self, params):
+        """
+        Narrow the disparity search range to what min_depth needs, when that is smaller.
+
+        Presets pick their range for a latency/quality trade-off, so a calibrated
+        range that is larger (close min_depth, wide baseline) leaves them unchanged.
+        """
+        if self.rectifier is None or self.min_depth is None:
+            return params
+        num_disparities = self.rectifier.num_disparities_for(self.min_depth, params.scale, self.max_disparities)
+        if num_disparities >= params.num_disparities:
+            return params
+        return params.with_changes(num_disparities=num_disparities)
+
+    def submit(self, left, right, params=None):
+        """Queue a pair on the engine; returns a Future resolving to a DepthResult."""
+        return self._executor.submit(self.compute, left, right, params)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        with self._workers_lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _to_gray(image, out):
+    """Write `image` into the uint8 plane `out` as grayscale."""
+    if image.ndim == 3:
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=out)
+    else:
+        np.copyto(out, image)
+
+
+def _benchmark(pairs=12):
+    """Throughput of the engine on the test_images stereo pairs with 1 to 4 workers."""
+    import glob
+
+    images = []
+    for left_path in sorted(glob.glob("test_images/left_image*.png")):
+        right_path = left_path.replace("left_image", "right_image")
+        images.append((cv2.imread(left_path), cv2.imread(right_path)))
+
+    print(f"{mp.cpu_count()} CPU(s) available")
+    for workers in range(1, 5):
+        with DepthEngine(workers=workers, max_shape=images[0][0].shape[:2], cv_threads=1) as engine:
+            start = time.perf_counter()
+            futures = [engine.submit(*images[i % len(images)]) for i in range(pairs)]
+            for future in futures:
+                future.result().release()
+            elapsed = time.perf_counter() - start
+        print(f"{workers} worker(s): {pairs} pairs in {elapsed:.2f} s ({pairs / elapsed:.2f} pairs/s)")
+
+
+if __name__ == "__main__":
+    _benchmark()
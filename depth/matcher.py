@@ -0,0 +1,162 @@
+import threading
+from dataclasses import dataclass, replace
+from typing import Optional
+import cv2
+import numpy as np
+
+# WLS filtering lives in opencv-contrib, which may not be installed
+HAS_XIMGPROC = hasattr(cv2, "ximgproc")
+
+
+@dataclass(frozen=True)
+class StereoParams:
+    """Stereo matcher settings. Instances are hashable and used as cache keys."""
+    algorithm: str = "sgbm"  # "sgbm" or "bm"
+    min_disparity: int = 0
+    num_disparities: int = 16 * 6  # Must be a multiple of 16
+    block_size: int = 6
+    p1: Optional[int] = None  # Defaults to 8 * block_size ** 2
+    p2: Optional[int] = None  # Defaults to 32 * block_size ** 2
+    disp12_max_diff: int = 1
+    uniqueness_ratio: int = 7
+    speckle_window_size: int = 0
+    speckle_range: int = 2
+    pre_filter_cap: int = 63
+    mode: int = cv2.STEREO_SGBM_MODE_SGBM_3WAY
+    scale: float = 1.0  # Downscale factor applied to the input before matching
+    equalize: bool = True  # Histogram-equalize both images first
+    wls: bool = False  # Refine with a WLS filter (needs opencv-contrib)
+    wls_lambda: float = 8000.0
+    wls_sigma: float = 1.5
+
+    def with_changes(self, **changes) -> "StereoParams":
+        return replace(self, **changes)
+
+
+PRESETS = {
+    # Quick look: block matching on a half-size image with a short search range
+    "fast_preview": StereoParams(algorithm="bm", num_disparities=16 * 3, block_size=15, scale=0.5),
+    # What the camera has always used
+    "balanced": StereoParams(),
+    # Slowest, best edges: 3-way SGBM with speckle filtering and WLS refinement
+    "archive_quality": StereoParams(block_size=5, speckle_window_size=100, wls=True),
+}
+
+_local = threading.local()
+
+
+def _create_matcher(params: StereoParams):
+    if params.algorithm == "bm":
+        matcher = cv2.StereoBM_create(numDisparities=params.num_disparities, blockSize=params.block_size)
+        matcher.setMinDisparity(params.min_disparity)
+        matcher.setUniquenessRatio(params.uniqueness_ratio)
+        matcher.setSpeckleWindowSize(params.speckle_window_size)
+        matcher.setSpeckleRange(params.speckle_range)
+        matcher.setDisp12MaxDiff(params.disp12_max_diff)
+        matcher.setPreFilterCap(min(params.pre_filter_cap, 63))
+        return matcher
+
+    if params.algorithm == "sgbm":
+        return cv2.StereoSGBM_create(
+            minDisparity=params.min_disparity,
+            numDisparities=params.num_disparities,
+            blockSize=params.block_size,
+            P1=params.p1 if params.p1 is not None else 8 * 1 * params.block_size ** 2,
+            P2=params.p2 if params.p2 is not None else 32 * 1 * params.block_size ** 2,
+            disp12MaxDiff=params.disp12_max_diff,
+            uniquenessRatio=params.uniqueness_ratio,
+            speckleWindowSize=params.speckle_window_size,
+            speckleRange=params.speckle_range,
+            preFilterCap=params.pre_filter_cap,
+            mode=params.mode,
+        )
+
+    raise ValueError(f"Unknown stereo algorithm: {params.algorithm}")
+
+
+def get_matcher(params: StereoParams = PRESETS["balanced"]):
+    """
+    Return the matcher for `params`, building it on first use.
+
+    OpenCV matchers keep internal scratch buffers, so the cache is per thread.
+    """
+    matchers = getattr(_local, "matchers", None)
+    if matchers is None:
+        matchers = _local.matchers = {}
+
+    matcher = matchers.get(params)
+    if matcher is None:
+        matcher = matchers[params] = _create_matcher(params)
+    return matcher
+
+
+def _get_wls_pair(params: StereoParams):
+    """Right matcher and WLS filter for `params`, cached next to the left matcher."""
+    filters = getattr(_local, "wls", None)
+    if filters is None:
+        filters = _local.wls = {}
+
+    pair = filters.get(params)
+    if pair is None:
+        left_matcher = get_matcher(params)
+        right_matcher = cv2.ximgproc.createRightMatcher(left_matcher)
+        wls_filter = cv2.ximgproc.createDisparityWLSFilter(left_matcher)
+        wls_filter.setLambda(params.wls_lambda)
+        wls_filter.setSigmaColor(params.wls_sigma)
+        pair = filters[params] = (right_matcher, wls_filter)
+    return pair
+
+
+def resolve_params(params) -> StereoParams:
+    """Accept a StereoParams, a preset name or None (the balanced preset)."""
+    if params is None:
+        return PRESETS["balanced"]
+    if isinstance(params, str):
+        try:
+            return PRESETS[params]
+        except KeyError:
+            raise ValueError(f"Unknown stereo preset: {params}")
+    return params
+
+
+def compute_disparity(left, right, params=None, out=None):
+    """
+    Compute a float32 disparity map (in pixels) for a grayscale stereo pair.
+
+    Downscaled presets are matched at low resolution and the disparity is scaled back up
+    to the input size. `equalize` modifies the inputs in place.
+    """
+    params = resolve_params(params)
+    height, width = left.shape[:2]
+
+    if params.equalize:
+        cv2.equalizeHist(left, dst=left)
+        cv2.equalizeHist(right, dst=right)
+
+    if params.scale != 1.0:
+        size = (int(width * params.scale), int(height * params.scale))
+        left = cv2.resize(left, size, interpolation=cv2.INTER_AREA)
+        right = cv2.resize(right, size, interpolation=cv2.INTER_AREA)
+
+    matcher = get_matcher(params)
+    raw = matcher.compute(left, right)
+
+    if params.wls:
+        if HAS_XIMGPROC:
+            right_matcher, wls_filter = _get_wls_pair(params)
+            raw_right = right_matcher.compute(right, left)
+            raw = wls_filter.filter(raw, left, disparity_map_right=raw_right)
+        else:
+            print("Warning: WLS filtering needs opencv-contrib-python; skipping it")
+
+    if out is None:
+        out = np.empty((height, width), dtype=np.float32)
+
+    if params.scale != 1.0:
+        # Disparities shrink with the image, so scale the values back up with it
+        upscaled = cv2.resize(raw, (width, height), interpolation=cv2.INTER_NEAREST)
+        np.multiply(upscaled, 1 / (16.0 * params.scale), out=out, casting="unsafe")
+    else:
+        np.multiply(raw, 1 / 16.0, out=out, casting="unsafe")
+
+    return out
@@ -0,0 +1,148 @@
+import hashlib
+import math
+import os
+import cv2
+import numpy as np
+
+CALIBRATION_FILE = "calibration_data.npz"
+MAPS_CACHE_FILE = "calibration_maps.npz"
+MAX_NUM_DISPARITIES = 256  # SGBM time and memory grow linearly with the search range
+
+_CALIBRATION_KEYS = ("mtx_left", "dist_left", "mtx_right", "dist_right", "R", "T")
+
+
+class StereoRectifier:
+    """
+    Undistort-and-rectify stage built from calibrate_cam.py's output.
+
+    stereoRectify/initUndistortRectifyMap run once; every pair afterwards is a pair of
+    cv2.remap calls into preallocated buffers. Fixed-point (int16) maps are the default
+    because remap is noticeably faster with them on the Pi.
+    """
+
+    def __init__(self, calibration, image_size, alpha=0.0, fixed_point=True):
+        """
+        Args:
+            calibration (dict): mtx_left, dist_left, mtx_right, dist_right, R and T arrays.
+            image_size (tuple): (width, height) of one stereo half.
+            alpha (float): 0 crops to valid pixels only, 1 keeps the whole source image.
+            fixed_point (bool): Build CV_16SC2 maps instead of float32 maps.
+        """
+        self.calibration = {key: np.asarray(calibration[key], dtype=np.float64) for key in _CALIBRATION_KEYS}
+        self.image_size = tuple(image_size)
+        self.alpha = alpha
+        self.fixed_point = fixed_point
+
+        c = self.calibration
+        self.R1, self.R2, self.P1, self.P2, self.Q, self.roi_left, self.roi_right = cv2.stereoRectify(
+            c["mtx_left"], c["dist_left"], c["mtx_right"], c["dist_right"],
+            self.image_size, c["R"], c["T"], alpha=alpha,
+        )
+        self.maps = None
+        self._left = None
+        self._right = None
+
+    @classmethod
+    def from_file(cls, image_size, calibration_file=CALIBRATION_FILE, cache_file=MAPS_CACHE_FILE,
+                  alpha=0.0, fixed_point=True):
+        """Load calibration and reuse cached remap tables when they match, else build and cache them."""
+        with np.load(calibration_file) as data:
+            calibration = {key: data[key] for key in _CALIBRATION_KEYS}
+
+        rectifier = cls(calibration, image_size, alpha, fixed_point)
+        if cache_file is None or not rectifier.load_maps(cache_file):
+            rectifier.build_maps()
+            if cache_file is not None:
+                rectifier.save_maps(cache_file)
+        return rectifier
+
+    @property
+    def digest(self) -> str:
+        """Identifies the calibration and options the maps were built for."""
+        hasher = hashlib.sha256()
+        for key in _CALIBRATION_KEYS:
+            hasher.update(self.calibration[key].tobytes())
+        hasher.update(repr((self.image_size, self.alpha, self.fixed_point)).encode("ascii"))
+        return hasher.hexdigest()
+
+    @property
+    def focal_length(self) -> float:
+        """Focal length in pixels of the rectified cameras."""
+        return float(self.P1[0, 0])
+
+    @property
+    def baseline(self) -> float:
+        """Distance between the rectified camera centres, in calibration units (metres)."""
+        return float(abs(self.P2[0, 3] / self.P2[0, 0]))
+
+    def build_maps(self):
+        c = self.calibration
+        map_type = cv2.CV_16SC2 if self.fixed_point else cv2.CV_32FC1
+        left = cv2.initUndistortRectifyMap(c["mtx_left"], c["dist_left"], self.R1, self.P1, self.image_size, map_type)
+        right = cv2.initUndistortRectifyMap(c["mtx_right"], c["dist_right"], self.R2, self.P2, self.image_size, map_type)
+        self.maps = (left, right)
+
+    def save_maps(self, cache_file):
+        (left_x, left_y), (right_x, right_y) = self.maps
+        np.savez(cache_file, digest=self.digest, left_x=left_x, left_y=left_y, right_x=right_x, right_y=right_y)
+
+    def load_maps(self, cache_file) -> bool:
+        """Load cached maps; returns False if the cache is missing or stale."""
+        if not os.path.exists(cache_file):
+            return False
+        try:
+            with np.load(cache_file) as data:
+                if str(data["digest"]) != self.digest:
+                    return False
+                self.maps = ((data["left_x"], data["left_y"]), (data["right_x"], data["right_y"]))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Ignoring rectification cache {cache_file}: {e}")
+            return False
+        return True
+
+    def rectify(self, left, right):
+        """
+        Return rectified (left, right) images.
+
+        The results are written into buffers owned by the rectifier and are overwritten
+        by the next call.
+        """
+        if self.maps is None:
+            self.build_maps()
+        if left.shape[1::-1][:2] != self.image_size:
+            raise ValueError(f"Stereo pair {left.shape[1::-1][:2]} does not match calibration size {self.image_size}")
+
+        if self._left is None or self._left.shape != left.shape or self._left.dtype != left.dtype:
+            self._left = np.empty_like(left)
+            self._right = np.empty_like(right)
+
+        (left_x, left_y), (right_x, right_y) = self.maps
+        cv2.remap(left, left_x, left_y, cv2.INTER_LINEAR, dst=self._left)
+        cv2.remap(right, right_x, right_y, cv2.INTER_LINEAR, dst=self._right)
+        return self._left, self._right
+
+    def rectify_left(self, image):
+        """
+        Return the left image (any channel count) remapped into the rectified left frame.
+
+        This is the frame disparity and depth are computed in. The result is a new
+        array, so color stills can be rectified alongside the matcher's grayscale pairs.
+        """
+        if self.maps is None:
+            self.build_maps()
+        if image.shape[1::-1][:2] != self.image_size:
+            raise ValueError(f"Image {image.shape[1::-1][:2]} does not match calibration size {self.image_size}")
+        (left_x, left_y), _ = self.maps
+        return cv2.remap(image, left_x, left_y, cv2.INTER_LINEAR)
+
+    def num_disparities_for(self, min_depth, scale=1.0, maximum=MAX_NUM_DISPARITIES) -> int:
+        """
+        Smallest multiple of 16 disparities that still sees objects `min_depth` metres away.
+
+        Clamped to `maximum` (rounded down to a multiple of 16): close range on a wide
+        baseline asks for thousands of disparities, and anything nearer than
+        focal_length * baseline * scale / maximum is then out of reach.
+        """
+        max_disparity = self.focal_length * self.baseline * scale / min_depth
+        needed = int(math.ceil(max_disparity / 16.0)) * 16
+        return max(16, min(needed, maximum // 16 * 16))
@@ -2,35 +2,29 @@ import numpy as np
 import cv2 as cv
 from matplotlib import pyplot as plt
 
+from depth.matcher import StereoParams, get_matcher
+from depth.rectify import StereoRectifier
+
 # Load and preprocess the images
 left_image = cv.imread("test_images/left_cam_1.png", cv.IMREAD_GRAYSCALE)
 right_image = cv.imread("test_images/right_cam_1.png", cv.IMREAD_GRAYSCALE)
 
-# Align the left image (adjust based on observed misalignment)
-x_offset = 0
-y_offset = 63
+# Rectify both images with the stereo calibration (replaces the hand-tuned offsets)
 rows, cols = right_image.shape
-translation_matrix = np.float32([[1, 0, x_offset], [0, 1, y_offset]])
-left_image = cv.warpAffine(left_image, translation_matrix, (cols, rows))
+rectifier = StereoRectifier.from_file((cols, rows))
+left_image, right_image = rectifier.rectify(left_image, right_image)
 
 # Equalize histograms for better contrast
 left_image = cv.equalizeHist(left_image)
 right_image = cv.equalizeHist(right_image)
 
 # StereoSGBM with selected parameters
-stereo = cv.StereoSGBM_create(
-    minDisparity=0,
-    numDisparities=48,      # Selected value (must be a multiple of 16)
-    blockSize=11,            # Selected value
-    P1=8 * 1 * 11 ** 2,      # P1 based on blockSize
-    P2=64 * 1 * 11 ** 2,     # P2 based on blockSize
-    disp12MaxDiff=1,
-    uniquenessRatio=7,      # Selected value
-    speckleWindowSize=100,   # Default for noise removal
-    speckleRange=2,         # Default for disparity variation
-    preFilterCap=63,
-    mode=cv.STEREO_SGBM_MODE_SGBM_3WAY  # High-quality mode
-)
+stereo = get_matcher(StereoParams(
+    num_disparities=48,      # Selected value (must be a multiple of 16)
+    block_size=11,           # Selected value
+    p2=64 * 1 * 11 ** 2,     # P2 based on blockSize (P1 defaults to 8 * blockSize^2)
+    speckle_window_size=100, # Default for noise removal
+))
 
 # Compute disparity map
 depth = stereo.compute(left_image, right_image)
@@ -1,11 +1,15 @@
 import cv2
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import struct
 import zlib
 from PIL import Image
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from depth.matcher import PRESETS, compute_disparity
+
 image_path = "../test_images/stereo_vision.png"
 left_image_path = "../test_images/left_image_3.png"
 right_image_path = "../test_images/right_image_3.png"
@@ -59,31 +63,11 @@ def create_depth_map_SGBM():
     left_img = cv2.imread(left_image_path, cv2.IMREAD_GRAYSCALE)
     right_img = cv2.imread(right_image_path, cv2.IMREAD_GRAYSCALE)
 
-    left_img = cv2.equalizeHist(left_img)
-    right_img = cv2.equalizeHist(right_img)
-    
-    window_size = 6
-    n_disp_factor = 6 # adjust
-    num_disp = 16*n_disp_factor
-
     focal_length = 1000
     baseline = 0.6
 
-    stereo = cv2.StereoSGBM_create(
-        minDisparity=0,
-        numDisparities=num_disp,
-        blockSize=window_size,
-        P1=8*1*window_size**2,
-        P2=32*1*window_size**2,
-        disp12MaxDiff=1,
-        uniquenessRatio=7,
-        speckleWindowSize=0,
-        speckleRange=2,
-        preFilterCap=63,
-        mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY
-    )
-
-    disparity = stereo.compute(left_img, right_img).astype(np.float32) / 16.0
+    # Shared, cached matcher (equalizes both images first)
+    disparity = compute_disparity(left_img, right_img, PRESETS["balanced"])
 
     depth_map = np.zeros_like(disparity, dtype=np.float32)
     disparity[disparity == 0] = 1
@@ -97,31 +81,11 @@ def create_depth_map():
     left_img = cv2.imread(left_image_path, cv2.IMREAD_GRAYSCALE)
     right_img = cv2.imread(right_image_path, cv2.IMREAD_GRAYSCALE)
 
-    left_img = cv2.equalizeHist(left_img)
-    right_img = cv2.equalizeHist(right_img)
-    
-    window_size = 6
-    n_disp_factor = 6 # adjust
-    num_disp = 16*n_disp_factor
-
     focal_length = 1000
     baseline = 0.6
 
-    stereo = cv2.StereoSGBM_create(
-        minDisparity=0,
-        numDisparities=num_disp,
-        blockSize=window_size,
-        P1=8*1*window_size**2,
-        P2=32*1*window_size**2,
-        disp12MaxDiff=1,
-        uniquenessRatio=7,
-        speckleWindowSize=0,
-        speckleRange=2,
-        preFilterCap=63,
-        mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY
-    )
-
-    disparity = stereo.compute(left_img, right_img).astype(np.float32) / 16.0
+    # Shared, cached matcher (equalizes both images first)
+    disparity = compute_disparity(left_img, right_img, PRESETS["balanced"])
 
     depth_map = np.zeros_like(disparity, dtype=np.float32)
     disparity[disparity == 0] = 1
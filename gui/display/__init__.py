@@ -0,0 +1,3 @@
+from .display import DisplayBackend, FrameTimer, PhotoImageBackend, FramebufferBackend, create_backend
+
+__all__ = ["DisplayBackend", "FrameTimer", "PhotoImageBackend", "FramebufferBackend", "create_backend"]
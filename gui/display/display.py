@@ -0,0 +1,167 @@
+import os
+import time
+from contextlib import contextmanager
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class FrameTimer:
+    """Track frames per second and a running average of each named pipeline stage."""
+
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.stage_ms = {}
+        self.fps = 0.0
+        self.frames = 0
+        self._last_frame = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with-block as the stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        """Fold one stage duration (in seconds) into the running average."""
+        ms = seconds * 1000
+        previous = self.stage_ms.get(name)
+        if previous is None:
+            self.stage_ms[name] = ms
+        else:
+            self.stage_ms[name] = self.smoothing * previous + (1 - self.smoothing) * ms
+
+    def tick(self):
+        """Mark the end of a displayed frame."""
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            instant = 1.0 / max(now - self._last_frame, 1e-6)
+            self.fps = instant if self.frames == 1 else self.smoothing * self.fps + (1 - self.smoothing) * instant
+        self._last_frame = now
+        self.frames += 1
+
+    def stats(self) -> dict:
+        return {"fps": self.fps, "frames": self.frames, "stage_ms": dict(self.stage_ms)}
+
+
+class DisplayBackend:
+    """
+    Interface for pushing processed BGR preview frames to the screen.
+
+    Backends allocate their output buffers once in configure() and reuse them for every
+    frame handed to show().
+    """
+
+    def __init__(self):
+        self.timer = FrameTimer()
+        self.width = 0
+        self.height = 0
+
+    def configure(self, width, height):
+        """(Re)allocate output buffers for a width x height preview."""
+        self.width = width
+        self.height = height
+
+    def show(self, frame):
+        """Display a BGR frame that is already width x height."""
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            self.configure(frame.shape[1], frame.shape[0])
+
+        self.blit(frame)
+        self.timer.tick()
+
+    def blit(self, frame):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return self.timer.stats()
+
+    def close(self):
+        pass
+
+
+class PhotoImageBackend(DisplayBackend):
+    """Paste frames into one long-lived ImageTk.PhotoImage shown by a Tk label."""
+
+    def __init__(self, label):
+        super().__init__()
+        self.label = label
+        self.photo = None
+        self.rgb = None
+        self.image = None
+
+    def configure(self, width, height):
+        super().configure(width, height)
+
+        # Reused RGB buffer and a PIL image that shares its memory
+        self.rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self.image = Image.frombuffer("RGB", (width, height), self.rgb, "raw", "RGB", 0, 1)
+
+        self.photo = ImageTk.PhotoImage("RGB", (width, height), master=self.label)
+        self.label.config(image=self.photo)
+        self.label.imgtk = self.photo  # Store reference to avoid garbage collection
+
+    def blit(self, frame):
+        with self.timer.stage("convert"):
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+
+        with self.timer.stage("blit"):
+            self.photo.paste(self.image)
+
+
+class FramebufferBackend(DisplayBackend):
+    """Write frames directly into a Linux framebuffer device, bypassing Tk entirely."""
+
+    def __init__(self, device="/dev/fb0"):
+        super().__init__()
+        self.device = device
+
+        name = os.path.basename(device)
+        with open(f"/sys/class/graphics/{name}/virtual_size") as f:
+            self.fb_width, self.fb_height = (int(v) for v in f.read().strip().split(","))
+        with open(f"/sys/class/graphics/{name}/bits_per_pixel") as f:
+            self.bits_per_pixel = int(f.read().strip())
+        with open(f"/sys/class/graphics/{name}/stride") as f:
+            self.stride = int(f.read().strip())
+
+        if self.bits_per_pixel not in (16, 32):
+            raise ValueError(f"Unsupported framebuffer depth: {self.bits_per_pixel} bpp")
+
+        channels = self.bits_per_pixel // 8 if self.bits_per_pixel == 32 else 2
+        self.fb = np.memmap(device, dtype=np.uint8, mode="r+", shape=(self.fb_height, self.stride))
+        self.pixels = self.fb[:, :self.fb_width * channels].reshape(self.fb_height, self.fb_width, channels)
+
+    def configure(self, width, height):
+        if width > self.fb_width or height > self.fb_height:
+            raise ValueError(f"Frame {width}x{height} does not fit framebuffer {self.fb_width}x{self.fb_height}")
+        super().configure(width, height)
+
+    def blit(self, frame):
+        target = self.pixels[:self.height, :self.width]
+        with self.timer.stage("blit"):
+            if self.bits_per_pixel == 32:
+                target[...] = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+            else:
+                target[...] = cv2.cvtColor(frame, cv2.COLOR_BGR2BGR565)
+
+    def close(self):
+        self.fb.flush()
+        del self.fb
+
+
+BACKENDS = {
+    "photoimage": PhotoImageBackend,
+    "framebuffer": FramebufferBackend,
+}
+
+
+def create_backend(name, *args, **kwargs) -> DisplayBackend:
+    """Create a display backend by name (see BACKENDS)."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown display backend: {name}")
+    return backend_class(*args, **kwargs)
@@ -4,6 +4,7 @@ import tkinter as tk
 from PIL import Image, ImageTk
 
 from gui.image_viewer.image_viewer import Image_Viewer
+from imaging.upload_queue import get_upload_queue
 
 # Expand the home directory properly
 LOCAL_DIRECTORY = "./gallery/local"
@@ -74,9 +75,12 @@ class Gallery:
         """Load and display a local image as a button."""
         row, col = 1, 1  # Position for the local image
 
+        # Captures waiting in the upload queue are no longer shown as local
+        queued = set(get_upload_queue().pending_paths())
         img_paths = sorted(
             [os.path.join(LOCAL_DIRECTORY, name) for name in os.listdir(LOCAL_DIRECTORY)
-            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))],
+            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))
+            and os.path.abspath(os.path.join(LOCAL_DIRECTORY, name)) not in queued],
             reverse=True
         )
 
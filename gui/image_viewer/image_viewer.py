@@ -2,7 +2,7 @@ import tkinter as tk
 from PIL import Image, ImageTk
 import os
 
-from imaging.encrypt import sign_png
+from imaging.upload_queue import get_upload_queue
 
 class Image_Viewer:
     """A class to handle full-screen image viewing with navigation and togglable UI."""
@@ -232,12 +232,24 @@ class Image_Viewer:
             return  # No images left
 
         img_path = self.image_paths[self.current_index]
-        try:
-            sign_png(img_path)
-        except Exception as e:
-            print(f"Error signing image {img_path}: {e}")
-        
-        self.delete_image()
+
+        # Signing and uploading happen in the background; the file stays in
+        # gallery/local until the server has acknowledged it
+        get_upload_queue().enqueue(img_path)
+        self.forget_current_image()
+
+    def forget_current_image(self):
+        """Drops the current image from the viewer and moves to the next one."""
+        del self.image_paths[self.current_index]
+
+        if self.image_paths:
+            # If images remain, show the next or previous one
+            if self.current_index >= len(self.image_paths):  # If last image was deleted
+                self.current_index -= 1  # Move to previous
+            self.display_image()
+        else:
+            # No images left → Show "No Images Left" message
+            self.show_no_images_message()
 
     def delete_image(self):
         """Deletes the current image and moves to the next one or shows a message if none remain."""
@@ -250,17 +262,7 @@ class Image_Viewer:
             os.remove(img_path)  # Delete the file
             print(f"Deleted: {img_path}")
 
-            # Remove from the list
-            del self.image_paths[self.current_index]
-
-            if self.image_paths:
-                # If images remain, show the next or previous one
-                if self.current_index >= len(self.image_paths):  # If last image was deleted
-                    self.current_index -= 1  # Move to previous
-                self.display_image()
-            else:
-                # No images left → Show "No Images Left" message
-                self.show_no_images_message()
+            self.forget_current_image()
 
         except Exception as e:
             print(f"Error deleting {img_path}: {e}")
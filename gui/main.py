@@ -5,6 +5,8 @@ import numpy as np
 import zlib
 import struct
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
 from datetime import datetime
 from tkinter import Label
@@ -13,15 +15,62 @@ import RPi.GPIO as GPIO
 import gui.image_processing as img_proc
 from gui.menu import OverlayMenu
 from gui.gallery import Gallery
+from gui.display import create_backend
+from camera import CameraManager
+from processing import JobState, ProcessingScheduler
+from depth import DepthEngine, DepthQuantizer, StereoRectifier
+from depth.rectify import CALIBRATION_FILE
+from imaging.artifact import write_artifact
+from imaging.png_encoder import ParallelPngEncoder
+from imaging.depth_chunk import encode_depth_chunk, encode_depth_pyramid
 from imaging.encrypt import sign_png
+from imaging.keys import key_manager
+from imaging.upload_queue import get_upload_queue
 
 
 # GLOBAL VARIABLES #
 fullscreen = True  # Start in fullscreen mode
 current_frame = None  # Store the current frame
 gallery_active = False  # Track if the gallery is active
-capturing_image = False
 GALLERY_DIRECTORY = "./gallery"
+PREVIEW_CAMERA_INDEX = 0
+STEREO_CAMERA_INDEX = 2
+DISPLAY_BACKEND = "photoimage"  # "framebuffer" writes straight to /dev/fb0
+DEBUG_SAVE_INTERMEDIATE = False  # Also dump the raw, left, right and depth images to need_processing
+PROCESSING_WORKERS = 1  # Concurrent depth/embed jobs; each SGBM run is memory hungry on the Pi
+PROCESSING_QUEUE_SIZE = 2  # Shots allowed to wait for a worker
+PROCESSING_QUEUE_POLICY = "reject"  # Shots are refused up front while the queue is full; never "coalesce"
+STEREO_HALF_SHAPE = (1520, 1920)  # (height, width) of one half of the stereo still
+RECTIFY_STEREO = True  # Undistort/rectify pairs with calibration_data.npz before matching
+DEPTH_RANGE = (0.3, 10.0)  # Metres covered by the stored depth codes, identical for every shot
+# Nearest metres SGBM must match; narrows the presets' disparity search (never widens it) when set.
+# With calibration_data.npz every preset's range already stops at ~8 m, so only far-field setups
+# gain from it
+DEPTH_MATCH_MIN_DEPTH = None
+DEPTH_PRESET = "balanced"  # "fast_preview", "balanced" or "archive_quality" (see depth.PRESETS)
+NOTICE_SECONDS = 2.0  # How long messages such as a refused shot stay on screen
+PREVIEW_REOPEN_INTERVAL = 1.0  # Seconds between attempts to restart a preview stream that stopped
+PRINT_PREVIEW_STATS = False  # Periodically print capture/display timings
+PREVIEW_STATS_INTERVAL = 5.0  # Seconds between stats printouts
+SIGN_AT_CAPTURE = True  # Sign captures as they are written instead of at upload
+UPLOAD_WORKERS = 1  # Concurrent background uploads
+UPLOAD_MAX_BYTES_PER_SECOND = 1_000_000  # Keeps uploads from starving the preview; None for no limit
+PNG_ENCODER_PROFILE = "fast"  # "fast", "balanced" or "archive" (see imaging.png_encoder.PROFILES)
+DEPTH_CHUNK_FILTER = "none"  # "up"/"sub" row prediction; pays off on smooth depth, not on SGBM output
+DEPTH_CHUNK_CODEC = "zlib"  # "zlib" or "lzma" (smaller, slower)
+DEPTH_TILE_SIZE = 256  # Independently compressed depth tiles for region reads; None stores one stream
+DEPTH_PYRAMID_LEVELS = 3  # 1/2, 1/4 and 1/8 depth levels for thumbnails; 0 disables
+
+# Rectification maps are built (or loaded from cache) once at startup
+rectifier = None
+if RECTIFY_STEREO and os.path.exists(CALIBRATION_FILE):
+    rectifier = StereoRectifier.from_file(STEREO_HALF_SHAPE[::-1])
+
+depth_quantizer = DepthQuantizer(*DEPTH_RANGE, dtype=np.uint16)
+
+# Start the SGBM worker processes before Tk and the camera threads exist
+depth_engine = DepthEngine(workers=PROCESSING_WORKERS, max_shape=STEREO_HALF_SHAPE, params=DEPTH_PRESET,
+                           rectifier=rectifier, min_depth=DEPTH_MATCH_MIN_DEPTH)
 
 # Initialize the main Tkinter window
 root = tk.Tk()
@@ -32,6 +81,24 @@ root.attributes("-fullscreen", fullscreen)
 video_label = Label(root)
 video_label.pack(fill=tk.BOTH, expand=True)
 
+# Small overlay showing post-capture processing progress
+status_label = Label(video_label, text="", font=("Arial", 12), fg="white", bg="black")
+status_text = ""
+notice_text = ""  # Short-lived message shown instead of the job counts
+notice_until = 0.0
+still_pending = threading.Event()  # Set while the still-capture thread owns a shot
+
+# Display backend that reuses one output buffer for every preview frame
+if DISPLAY_BACKEND == "photoimage":
+    display = create_backend(DISPLAY_BACKEND, video_label)
+else:
+    display = create_backend(DISPLAY_BACKEND)
+last_stats_print = 0.0
+last_preview_start = 0.0
+
+# Downscale, gamma and sharpen with cached LUT/kernel and reused buffers
+preview_pipeline = img_proc.PreviewPipeline()
+
 # FEATURES # 
 # overlay_menu = OverlayMenu(root)
 
@@ -45,152 +112,100 @@ def toggle_fullscreen(event=None):
 
 def exit_fullscreen(event=None):
     """Exit fullscreen mode and close the application."""
-    global default_cam_capture
-    default_cam_capture.release()  # Release the video capture
+    preview_stream.stop()
+    still_executor.shutdown(wait=True)  # Let an in-flight grab finish before the camera goes away
+    scheduler.shutdown(wait=False)
+    depth_engine.close()
+    png_encoder.close()
+    upload_queue.stop(timeout=1.0)  # Unfinished uploads resume on the next start
+    camera_manager.release()  # Release the video captures
+    display.close()
     root.destroy()
 
-def capture_picture(filename, processing_path, local_path):
-    camera_index = 2
-    global capturing_image
-    capturing_image = True
+def capture_picture(filename, processing_path, local_path, depth_preset=None):
+    """Grab a still and queue its processing. Runs on the still-capture thread, never on Tk's."""
+    print(f"Capturing an image from camera {STEREO_CAMERA_INDEX}. Please wait...")
 
-    global default_cam_capture
-    if default_cam_capture.isOpened():
-        default_cam_capture.release()
+    # Grab a still from the already-open stereo camera; the preview keeps running
+    frame = camera_manager.capture_still("stereo")
 
-    camera = cv2.VideoCapture(camera_index)
-
-    if not camera.isOpened():
-        print(f"Error: Could not access the camera at index {camera_index}.")
+    if frame is None:
+        print(f"Error: Failed to capture frame from camera {STEREO_CAMERA_INDEX}.")
+        show_notice("Capture failed")
         return
 
-    print(f"Capturing an image from camera {camera_index}. Please wait...")
-
-    # Capture a single frame
-    ret, frame = camera.read()
-
-    image_path = f"{processing_path}/{filename}.png"
-
-    if not ret:
-        print(f"Error: Failed to capture frame from camera {camera_index}.")
-    else:
-        # Save the captured image
-        cv2.imwrite(image_path, frame)
-        print(f"Image saved to {os.path.abspath(image_path)}")
-
-    # Release the camera
-    camera.release()
-    capturing_image = False
-    default_cam_capture = cv2.VideoCapture(0)
-    update_frame()
-
-    image = Image.open(image_path)
+    print(f"Still capture: {camera_manager.stats()['stereo']}")
 
-    width, height = image.size
-    split_point = width // 2
+    # Depth and embedding run on the bounded worker pool
+    job = scheduler.submit(process_capture, filename, frame, processing_path, local_path,
+                           depth_preset or DEPTH_PRESET, name=filename)
+    if job.state == JobState.REJECTED:
+        # save_current_frame checked for room and only this thread submits, but a
+        # frame that was taken is never thrown away: keep it for later processing
+        os.makedirs(processing_path, exist_ok=True)
+        cv2.imwrite(f"{processing_path}/{filename}.png", frame)
+        print(f"Processing queue full; raw still kept in {os.path.abspath(processing_path)}")
+        show_notice("Busy - raw shot saved")
 
-    left_image = image.crop((0, 0, split_point, height))
-    right_image = image.crop((split_point, 0, width, height))
 
-    left_image.save(f"{processing_path}/{filename}_left.png")
-    right_image.save(f"{processing_path}/{filename}_right.png")
-    os.remove(image_path)
+def process_capture(filename, frame, processing_path, local_path, depth_preset):
+    """Turn a side-by-side still into the final PNG with an embedded depth chunk."""
+    # Split the side-by-side frame into views; nothing is copied or written to disk
+    split_point = frame.shape[1] // 2
+    left_frame = frame[:, :split_point]
+    right_frame = frame[:, split_point:]
 
-    threading.Thread(target=create_depth_map, args=(filename, processing_path, local_path)).start()
+    if DEBUG_SAVE_INTERMEDIATE:
+        cv2.imwrite(f"{processing_path}/{filename}.png", frame)
+        cv2.imwrite(f"{processing_path}/{filename}_left.png", left_frame)
+        cv2.imwrite(f"{processing_path}/{filename}_right.png", right_frame)
+        print(f"Intermediate images saved to {os.path.abspath(processing_path)}")
 
+    depth_map = create_depth_map(left_frame, right_frame, depth_preset)
 
-def create_depth_map(filename, processing_path, local_path):
-    left_img = cv2.imread(f"{processing_path}/{filename}_left.png", cv2.IMREAD_GRAYSCALE)
-    right_img = cv2.imread(f"{processing_path}/{filename}_right.png", cv2.IMREAD_GRAYSCALE)
+    # Disparity is referenced to the left view, in the rectified frame when rectifying,
+    # so that is the image whose pixels line up with the stored depth
+    image = depth_engine.rectifier.rectify_left(left_frame) if depth_engine.rectifier is not None else left_frame
 
-    left_img = cv2.equalizeHist(left_img)
-    right_img = cv2.equalizeHist(right_img)
-    
-    window_size = 6
-    n_disp_factor = 6 # adjust
-    num_disp = 16*n_disp_factor
+    if DEBUG_SAVE_INTERMEDIATE:
+        cv2.imwrite(f"{processing_path}/{filename}_depth.png", depth_map)
 
-    focal_length = 1000
-    baseline = 0.6
+    # Capture metadata rides along in the same write as the depth chunk
+    metadata = {
+        "CaptureTime": datetime.now().isoformat(timespec="seconds"),
+        "DepthPreset": depth_preset if isinstance(depth_preset, str) else "custom",
+        "DepthRange": f"{depth_quantizer.near},{depth_quantizer.far}",
+    }
+    add_depth_chunk_with_pixel_data(filename, image, local_path, depth_map, metadata)
 
-    stereo = cv2.StereoSGBM_create(
-        minDisparity=0,
-        numDisparities=num_disp,
-        blockSize=window_size,
-        P1=8*1*window_size**2,
-        P2=32*1*window_size**2,
-        disp12MaxDiff=1,
-        uniquenessRatio=7,
-        speckleWindowSize=0,
-        speckleRange=2,
-        preFilterCap=63,
-        mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY
-    )
 
-    disparity = stereo.compute(left_img, right_img).astype(np.float32) / 16.0
+def create_depth_map(left_frame, right_frame, depth_preset=DEPTH_PRESET):
+    # SGBM runs in a DepthEngine worker process; the result is a view into shared memory
+    with depth_engine.compute(left_frame, right_frame, params=depth_preset) as result:
+        # Fixed-range codes (0 = no depth) so values compare across shots
+        quantized_depth = depth_quantizer.quantize(result.depth, result.valid)
 
-    depth_map = np.zeros_like(disparity, dtype=np.float32)
-    disparity[disparity == 0] = 1
-    depth_map = (focal_length * baseline) / disparity
+    return quantized_depth
 
-    normalized_depth = cv2.normalize(depth_map, None, 0, 255, cv2.NORM_MINMAX)
-    normalized_depth = np.uint8(normalized_depth)
-
-    threading.Thread(target=add_depth_chunk_with_pixel_data, args=(filename, processing_path, local_path, normalized_depth)).start()
-
-
-def add_depth_chunk_with_pixel_data(filename, processing_path, local_path, depth_array):
-    right_image_path = f"{processing_path}/{filename}_right.png"
-    left_image_path = f"{processing_path}/{filename}_left.png"
 
+def add_depth_chunk_with_pixel_data(filename, image, local_path, depth_array, metadata=None):
     output_image = f"{local_path}/{filename}.png"
 
-    # Read the original PNG file
-    with open(right_image_path, "rb") as f:
-        png_data = f.read()
-    
-    # Validate PNG file (must start with PNG signature)
-    png_signature = b"\x89PNG\r\n\x1a\n"
-    if not png_data.startswith(png_signature):
-        raise ValueError("Not a valid PNG file")
-    
     # Validate depth array dimensions
-    img = Image.open(right_image_path)
-    if depth_array.shape != (img.height, img.width):
+    if depth_array.shape != image.shape[:2]:
         raise ValueError("Depth array dimensions must match the image dimensions")
-    
-    # Flatten the depth array and compress it
-    depth_bytes = depth_array.astype(np.uint8).tobytes()  # Convert to bytes
-    compressed_depth = zlib.compress(depth_bytes)         # Compress the depth data
-    
-    # Create a custom PNG chunk for depth data
-    chunk_type = b"dEPh"                                  # Custom chunk identifier
-    chunk_data = compressed_depth
-    chunk_length = struct.pack(">I", len(chunk_data))     # Length of the chunk data
-    chunk_crc = struct.pack(">I", zlib.crc32(chunk_type + chunk_data))  # CRC for validation
-    
-    custom_chunk = chunk_length + chunk_type + chunk_data + chunk_crc
-    
-    # Find the position of the IEND chunk
-    iend_index = png_data.rfind(b"IEND")
-    if iend_index == -1:
-        raise ValueError("PNG file is missing the IEND chunk")
-    
-    # Insert the custom chunk before the IEND chunk
-    new_png_data = png_data[:iend_index - 4] + custom_chunk + png_data[iend_index - 4:]
-    
-    # Write the modified PNG to a new file
-    with open(output_image, "wb") as f:
-        f.write(new_png_data)
-    print(f"Depth data chunk added to {output_image}")
 
-    # TEST SIGNING
-    # print("TESTING SIGNING")
-    # sign_png(output_image)
-    # print("DONE SIGNING")
+    # Versioned dEPh payload: header with the depth range, then the (tiled) codes
+    depth_chunk = encode_depth_chunk(depth_array, depth_quantizer, DEPTH_CHUNK_FILTER, DEPTH_CHUNK_CODEC,
+                                     tile_size=DEPTH_TILE_SIZE)
+    depth_levels = encode_depth_pyramid(depth_array, depth_quantizer, DEPTH_PYRAMID_LEVELS,
+                                        DEPTH_CHUNK_FILTER, DEPTH_CHUNK_CODEC)
 
-    os.remove(left_image_path)
-    os.remove(right_image_path)
+    # Encode, embed depth, hash and sign in a single write of the final file
+    private_key = key_manager.private_key() if SIGN_AT_CAPTURE else None
+    write_artifact(output_image, image, depth_chunk, metadata, private_key, encoder=png_encoder,
+                   depth_levels=depth_levels)
+    print(f"Depth data chunk added to {output_image}")
 
 
 def save_current_frame(event=None):
@@ -198,41 +213,106 @@ def save_current_frame(event=None):
     local_path = "gallery/local"
     processing_path = "gallery/need_processing"
 
+    # Refuse the shot before taking it rather than drop a frame that was captured
+    if still_pending.is_set() or scheduler.is_full():
+        print("Busy: shot not taken")
+        show_notice("Busy - shot not taken")
+        return
+
     print("Saving image")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Milliseconds keep shots taken within the same second from overwriting each other
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
     filename = f"frame_{timestamp}"
 
-    # 🚀 Start the capture process in a new thread
-    threading.Thread(target=capture_picture, args=(filename, processing_path, local_path)).start()
+    # The grab (stale frames included) takes several frame times, so it runs on the
+    # still-capture thread and the preview and buttons stay responsive
+    still_pending.set()
+    still_executor.submit(capture_picture, filename, processing_path, local_path).add_done_callback(finish_still)
+
+
+def finish_still(future):
+    """Free the shutter for the next shot once the still-capture thread is done."""
+    still_pending.clear()
+    if future.exception() is not None:
+        print(f"Error: still capture failed: {future.exception()}")
+        show_notice("Capture failed")
+
+
+def print_job_state(job):
+    """Log post-capture job transitions."""
+    print(f"Job {job.id} ({job.name}): {job.state.value}")
+
+
+def print_upload_state(path, state):
+    """Log background upload transitions."""
+    print(f"Upload {os.path.basename(path)}: {state}")
+
+
+def show_notice(text, seconds=NOTICE_SECONDS):
+    """Briefly show `text` over the preview; safe to call from any thread."""
+    global notice_text, notice_until
+    notice_text = text
+    notice_until = time.monotonic() + seconds
+
+
+def update_status_label():
+    """Show queued/running job counts, or a recent notice, over the preview."""
+    global status_text
+    summary = scheduler.summary()
+    if time.monotonic() < notice_until:
+        text = notice_text
+    elif summary["running"] or summary["queued"]:
+        text = f"Processing {summary['running']} | Queued {summary['queued']}"
+    else:
+        text = ""
+
+    if text != status_text:
+        status_text = text
+        if text:
+            status_label.config(text=text)
+            status_label.place(x=10, y=10)
+        else:
+            status_label.place_forget()
+
+
+def start_preview_stream():
+    """Start the background capture thread that feeds the live preview."""
+    global last_preview_start
+    last_preview_start = time.monotonic()
+    return camera_manager.preview_stream("preview")
 
 
 def update_frame():
     """Update the video frame in the Tkinter window."""
     global current_frame
-    global default_cam_capture
-    if gallery_active or capturing_image:  # Stop updating if gallery is active
+    global preview_stream
+    global last_stats_print
+    if gallery_active:  # Stop updating if gallery is active
         return
-    
-    if not default_cam_capture.isOpened():
-        default_cam_capture = cv2.VideoCapture(0)
 
-    ret, frame = default_cam_capture.read()
-    if ret:
+    # A stream stops when the camera cannot be opened; retry at a modest pace, not every tick
+    if not preview_stream.is_alive() and time.monotonic() - last_preview_start > PREVIEW_REOPEN_INTERVAL:
+        preview_stream = start_preview_stream()
+
+    # Newest frame from the capture thread, or None if nothing new arrived
+    frame = preview_stream.latest()
+    if frame is not None:
         current_frame = frame
 
         # Resize the frame to fit the Tkinter window
         screen_width = int(root.winfo_screenwidth())
         screen_height = int(root.winfo_screenheight())
-        resized_frame = cv2.resize(frame, (screen_width, screen_height))
+        with display.timer.stage("process"):
+            processed_frame = preview_pipeline.process(frame, (screen_width, screen_height))
+
+        # Blit into the backend's long-lived image, no per-frame encode
+        display.show(processed_frame)
 
-        # Convert to a Tkinter-compatible format
-        processed_frame = img_proc.process_image(resized_frame)
-        img = tk.PhotoImage(master=root, width=screen_width, height=screen_height,
-                            data=cv2.imencode('.ppm', processed_frame)[1].tobytes())
+        if PRINT_PREVIEW_STATS and time.perf_counter() - last_stats_print > PREVIEW_STATS_INTERVAL:
+            last_stats_print = time.perf_counter()
+            print(f"Preview: {display.stats()} capture: {preview_stream.stats()}")
 
-        # Update the label with the image
-        video_label.config(image=img)
-        video_label.imgtk = img  # Store reference to avoid garbage collection
+    update_status_label()
 
     # Schedule the next frame update
     video_label.after(5, update_frame)
@@ -266,6 +346,11 @@ def toggle_gallery(event=None):
         gallery_active = True
         gallery.open()
 
+# Durable background uploads; anything left from a previous session resumes now.
+# Created before the gallery, whose views use the same queue
+upload_queue = get_upload_queue(workers=UPLOAD_WORKERS, max_bytes_per_second=UPLOAD_MAX_BYTES_PER_SECOND,
+                                on_change=print_upload_state)
+
 gallery = Gallery(root, video_label, update_frame, toggle_gallery)
 
 root.bind("<Return>", toggle_gallery)  # Press "<Return>" to switch to the gallery
@@ -316,8 +401,22 @@ GPIO.add_event_detect(26, GPIO.FALLING, callback=click_26, bouncetime=200)
 GPIO.add_event_detect(20, GPIO.FALLING, callback=click_20, bouncetime=200)
 
 
-# Initialize OpenCV video capture
-default_cam_capture = cv2.VideoCapture(0)
+# Stills are deflated in row bands across all cores
+png_encoder = ParallelPngEncoder.from_profile(PNG_ENCODER_PROFILE)
+
+# One thread grabs stills so the Tk/GPIO thread never waits on the stereo camera
+still_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="still-capture")
+
+# Bounded worker pool for depth/embed jobs, so shutter bursts cannot pile up SGBM runs.
+# Always threads: process_capture uses depth_engine and png_encoder from this process,
+# and SGBM already runs in the depth engine's own worker processes
+scheduler = ProcessingScheduler(workers=PROCESSING_WORKERS, max_queue=PROCESSING_QUEUE_SIZE,
+                                policy=PROCESSING_QUEUE_POLICY, mode="thread",
+                                on_state_change=print_job_state)
+
+# Open both cameras once and keep them warm; the preview runs on its own thread
+camera_manager = CameraManager({"preview": PREVIEW_CAMERA_INDEX, "stereo": STEREO_CAMERA_INDEX}).open()
+preview_stream = start_preview_stream()
 
 # Start video updates
 update_frame()
@@ -0,0 +1,125 @@
+import os
+from binascii import hexlify
+from typing import Dict, Iterator, List, Optional, Tuple
+import cv2
+
+from imaging.depth_chunk import DEPTH_CHUNK_TYPE, DEPTH_LEVEL_CHUNK_TYPE, split_depth_payload
+from imaging.encrypt import sign_message
+from imaging.hashing import HashingWriter
+from imaging.png import IEND_CHUNK, ChunkIndex, make_chunk, make_text_chunk
+
+
+def encode_png_chunks(image, encoder=None) -> Iterator[memoryview]:
+    """
+    Encode a BGR image as PNG and yield the signature and each chunk up to (not including) IEND.
+
+    With a ParallelPngEncoder the IDAT chunks are yielded as their bands finish
+    compressing; otherwise the image is encoded in one go with cv2.
+    """
+    if encoder is not None:
+        yield from encoder.iter_chunks(image)
+        return
+
+    ret, encoded = cv2.imencode(".png", image)
+    if not ret:
+        raise ValueError("Failed to encode image as PNG")
+
+    view = memoryview(encoded).cast('B')
+    index = ChunkIndex.from_bytes(view)
+
+    yield view[:8]
+    for chunk in index.chunks:
+        if chunk.type == b'IEND':
+            break
+        yield view[chunk.offset:chunk.end]
+
+
+class ArtifactWriter:
+    """
+    Writes a TrueSight PNG exactly once, hashing every byte as it goes out.
+
+    The hash covers the file as it would be without the signature chunk, i.e. the
+    same bytes sign_png has always hashed, so signatures stay verifiable the old way.
+    With canonical=True only the image-content chunks are hashed instead, and a
+    HashMode text chunk records that for verifiers. The file is written under a
+    temporary name and renamed into place on finish().
+    """
+
+    def __init__(self, output_filename: str, private_key=None, canonical: bool = False):
+        self.output_filename = output_filename
+        self.private_key = private_key
+        self.canonical = canonical
+        self._temp_filename = f"{output_filename}.part"
+        self._file = open(self._temp_filename, 'wb')
+        self.hasher = HashingWriter(self._file, canonical=canonical)
+        self._finished = False
+
+    def write(self, data) -> None:
+        self.hasher.write(data)
+
+    def write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self.write(make_chunk(chunk_type, data))
+
+    def write_text(self, key: str, value: str) -> None:
+        self.write(make_text_chunk(key, value))
+
+    def finish(self) -> Tuple[bytes, Optional[str]]:
+        """Sign, append the signature chunk and IEND, and move the file into place."""
+        if self.canonical:
+            self.write_text("HashMode", "canonical")
+
+        # The unsigned file ends with IEND, so that is part of the signed hash
+        unsigned_hasher = self.hasher.copy()
+        unsigned_hasher.write(IEND_CHUNK)
+        image_hash = unsigned_hasher.digest()
+
+        signature = None
+        if self.private_key is not None:
+            signature = hexlify(sign_message(self.private_key, image_hash)).decode()
+            self._file.write(make_text_chunk("Signature", signature))
+
+        self._file.write(IEND_CHUNK)
+        self._file.close()
+        os.replace(self._temp_filename, self.output_filename)
+        self._finished = True
+        return image_hash, signature
+
+    def abort(self) -> None:
+        if not self._finished:
+            self._file.close()
+            os.remove(self._temp_filename)
+            self._finished = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+
+def write_artifact(output_filename: str, image, depth_data: Optional[bytes] = None,
+                   metadata: Optional[Dict[str, str]] = None, private_key=None,
+                   canonical: bool = False, encoder=None,
+                   depth_levels: Optional[List[bytes]] = None) -> Tuple[bytes, Optional[str]]:
+    """
+    Encode `image`, add the dEPh chunk and metadata, sign and write the final PNG in one pass.
+
+    `depth_levels` are optional reduced-resolution depth payloads (see
+    imaging.depth_chunk.encode_depth_pyramid), stored as dEPm chunks after dEPh.
+
+    Returns (image_hash, signature_hex); the signature is None without a private key.
+    """
+    with ArtifactWriter(output_filename, private_key, canonical) as writer:
+        for data in encode_png_chunks(image, encoder):
+            writer.write(data)
+
+        if depth_data is not None:
+            for piece in split_depth_payload(depth_data):
+                writer.write_chunk(DEPTH_CHUNK_TYPE, piece)
+        for level in depth_levels or []:
+            writer.write_chunk(DEPTH_LEVEL_CHUNK_TYPE, level)
+        for key, value in (metadata or {}).items():
+            writer.write_text(key, value)
+
+        return writer.finish()
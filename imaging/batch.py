@@ -0,0 +1,229 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from binascii import hexlify, unhexlify
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+from imaging.encrypt import UPLOADED_DIRECTORY, hash_unsigned_png, sign_message, verify_signature
+from imaging.hashing import hash_file
+from imaging.keys import key_manager
+from imaging.png import PngInteractor, get_chunk_index, insert_chunks_before_iend, make_text_chunk
+from imaging.send_to_db import UploaderClient
+
+LOCAL_DIRECTORY = "gallery/local"
+
+
+@dataclass
+class UploadResult:
+    """Outcome of one file in a batch."""
+    path: str
+    status: str = "pending"  # "uploaded" or "failed"
+    uploaded_path: Optional[str] = None
+    size: int = 0
+    hash_seconds: float = 0.0
+    upload_seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    results: List[UploadResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def uploaded(self) -> List[UploadResult]:
+        return [result for result in self.results if result.status == "uploaded"]
+
+    @property
+    def failed(self) -> List[UploadResult]:
+        return [result for result in self.results if result.status != "uploaded"]
+
+    @property
+    def images_per_second(self) -> float:
+        return len(self.uploaded) / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        total = sum(result.size for result in self.uploaded)
+        return total / 1e6 / self.wall_seconds if self.wall_seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "files": [asdict(result) for result in self.results],
+            "uploaded": len(self.uploaded),
+            "failed": len(self.failed),
+            "wall_seconds": self.wall_seconds,
+            "images_per_second": self.images_per_second,
+            "megabytes_per_second": self.megabytes_per_second,
+        }
+
+    def print_summary(self) -> None:
+        for result in self.results:
+            detail = result.uploaded_path if result.status == "uploaded" else result.error
+            print(f"{result.status:<9}{result.path}  ({detail})")
+        print(f"\n{len(self.uploaded)} uploaded, {len(self.failed)} failed in {self.wall_seconds:.2f}s: "
+              f"{self.images_per_second:.1f} images/s, {self.megabytes_per_second:.1f} MB/s")
+
+
+def prepare_signed(path: str) -> Tuple[bytes, str]:
+    """
+    Return (image_hash, signature_hex) for a capture, signing it in place if needed.
+
+    Captures signed by the artifact writer are verified against their embedded
+    signature. Older, unsigned captures get the same hash sign_png has always used
+    (the whole file), and the signed file atomically replaces the original so a failed
+    upload can be retried without signing again.
+    """
+    if get_chunk_index(path).find_text('Signature') is not None:
+        signature = PngInteractor(path).find_signature_metadata()
+        image_hash = hash_unsigned_png(path)
+        if not verify_signature(key_manager.public_key(), image_hash, unhexlify(signature)):
+            raise ValueError("Signature Verification Failed ✗")
+        return image_hash, signature
+
+    image_hash = hash_file(path)
+    signature = hexlify(sign_message(key_manager.private_key(), image_hash)).decode()
+
+    # The capture may be the only copy: write the signed file beside it, make it
+    # durable, then rename it over the original, as ArtifactWriter does
+    temp_filename = f"{path}.part"
+    try:
+        insert_chunks_before_iend(path, [make_text_chunk("Signature", signature)], temp_filename)
+        with open(temp_filename, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temp_filename, path)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    return image_hash, signature
+
+
+def sign_and_upload_many(paths: Iterable[str], hash_workers: int = 4, upload_concurrency: int = 2,
+                         base_url: Optional[str] = None, uploaded_directory: str = UPLOADED_DIRECTORY,
+                         client: Optional[UploaderClient] = None) -> BatchReport:
+    """
+    Sign (if needed) and upload many captures, moving each to `uploaded_directory` once accepted.
+
+    Files are hashed on a thread pool (hashlib and file reads release the GIL) and
+    handed to a separate, smaller pool of uploaders sharing one keep-alive client,
+    so at most `upload_concurrency` requests are in flight. Images are streamed from
+    disk. Files that fail stay where they are.
+    """
+    results = [UploadResult(path) for path in paths]
+    own_client = client is None
+    client = client or UploaderClient(base_url, pool_size=upload_concurrency)
+    os.makedirs(uploaded_directory, exist_ok=True)
+    lock = threading.Lock()
+
+    def prepare(result: UploadResult):
+        start = time.perf_counter()
+        signed = prepare_signed(result.path)
+        result.size = os.path.getsize(result.path)
+        result.hash_seconds = time.perf_counter() - start
+        return signed
+
+    def upload(result: UploadResult, image_hash: bytes, signature: str):
+        start = time.perf_counter()
+        response, upload_response = client.upload(image_hash, signature, result.path)
+        result.upload_seconds = time.perf_counter() - start
+        if not response.ok or not upload_response.ok:
+            raise RuntimeError(f"Server replied {response.status_code}/{upload_response.status_code}")
+
+        uploaded_path = os.path.join(uploaded_directory, f"done_{os.path.basename(result.path)}")
+        os.replace(result.path, uploaded_path)
+        result.uploaded_path = uploaded_path
+
+    def fail(result: UploadResult, error: Exception):
+        with lock:
+            result.status = "failed"
+            result.error = str(error)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix="batch-hash") as hash_pool, \
+            ThreadPoolExecutor(max_workers=upload_concurrency, thread_name_prefix="batch-upload") as upload_pool:
+        prepared = {hash_pool.submit(prepare, result): result for result in results}
+        uploads = {}
+        for future in as_completed(prepared):
+            result = prepared[future]
+            try:
+                image_hash, signature = future.result()
+            except Exception as e:
+                fail(result, e)
+                continue
+            uploads[upload_pool.submit(upload, result, image_hash, signature)] = result
+
+        for future in as_completed(uploads):
+            result = uploads[future]
+            try:
+                future.result()
+                result.status = "uploaded"
+            except Exception as e:
+                fail(result, e)
+
+    if own_client:
+        client.close()
+    return BatchReport(results, time.perf_counter() - start)
+
+
+def _benchmark(count=24, size=(720, 1280)):
+    """Throughput against a local stand-in server for a few hash/upload pool sizes."""
+    import tempfile
+    import numpy as np
+    from imaging.artifact import write_artifact
+    from imaging.standin_server import StandInServer
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (*size, 3), dtype=np.uint8)
+
+    with StandInServer() as server:
+        print(f"{count} captures of {size[1]}x{size[0]} against {server.base_url}\n")
+        print(f"{'hash workers':>13}{'uploaders':>11}{'images/s':>10}{'MB/s':>8}{'failed':>8}")
+        for hash_workers, upload_concurrency in ((1, 1), (2, 2), (4, 4)):
+            directory = tempfile.mkdtemp()
+            paths = []
+            for i in range(count):
+                path = os.path.join(directory, f"frame_{i:04d}.png")
+                write_artifact(path, image, private_key=None)  # Unsigned, like pre-existing captures
+                paths.append(path)
+
+            report = sign_and_upload_many(paths, hash_workers, upload_concurrency, server.base_url,
+                                          os.path.join(directory, "uploaded"))
+            print(f"{hash_workers:>13}{upload_concurrency:>11}{report.images_per_second:>10.1f}"
+                  f"{report.megabytes_per_second:>8.1f}{len(report.failed):>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sign and upload a backlog of TrueSight captures.")
+    parser.add_argument("paths", nargs="*", help=f"PNG files or directories (default: {LOCAL_DIRECTORY})")
+    parser.add_argument("--hash-workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=2, help="Uploads in flight at once")
+    parser.add_argument("--base-url", help="Server to upload to (default: send_to_db.BASE_URL)")
+    parser.add_argument("--uploaded-dir", default=UPLOADED_DIRECTORY)
+    parser.add_argument("--json", metavar="FILE", help="Also write the report as JSON")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark against a local stand-in server")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        _benchmark()
+        return 0
+
+    paths = []
+    for path in args.paths or [LOCAL_DIRECTORY]:
+        paths.extend(sorted(glob.glob(os.path.join(path, "*.png"))) if os.path.isdir(path) else [path])
+
+    report = sign_and_upload_many(paths, args.hash_workers, args.concurrency, args.base_url, args.uploaded_dir)
+    report.print_summary()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
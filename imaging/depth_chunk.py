@@ -0,0 +1,491 @@
+import mmap
+import struct
+import zlib
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+from imaging.png import get_chunk_index, read_chunk_data
+
+try:
+    import lzma
+except ImportError:  # Python builds without liblzma
+    lzma = None
+
+DEPTH_CHUNK_TYPE = b"dEPh"
+DEPTH_LEVEL_CHUNK_TYPE = b"dEPm"  # One reduced-resolution depth level per chunk, largest first
+DEPTH_CHUNK_MAGIC = b"DP"  # Legacy chunks are bare zlib streams, which start with 0x78
+DEPTH_CHUNK_VERSION = 2  # Version 2 adds the tiled layout
+
+# magic, version, dtype, filter, codec, flags, reserved, width, height,
+# scale, offset, near, far, min_code, invalid_value
+HEADER_FORMAT = ">2sBBBBBxIIffffHH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Tiled payloads: tile width and height, then (tiles + 1) big-endian uint32 offsets
+TILE_HEADER_FORMAT = ">HH"
+TILE_HEADER_SIZE = struct.calcsize(TILE_HEADER_FORMAT)
+
+MAX_CHUNK_PAYLOAD = 8 * 1024 * 1024  # Larger payloads are split over consecutive dEPh chunks
+
+DTYPES = {1: np.dtype(np.uint8), 2: np.dtype(np.uint16)}
+FILTERS = {"none": 0, "sub": 1, "up": 2}
+
+FLAG_BYTE_PLANES = 0x01  # uint16 samples stored as a low-byte plane followed by a high-byte plane
+FLAG_TILED = 0x02  # Independently compressed tiles behind an offset table
+
+
+class Codec(NamedTuple):
+    id: int
+    compress: Callable[[bytes, Optional[int]], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+CODECS: Dict[str, Codec] = {
+    "none": Codec(0, lambda data, level: bytes(data), bytes),
+    "zlib": Codec(1, lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+}
+if lzma is not None:
+    CODECS["lzma"] = Codec(2, lambda data, level: lzma.compress(data, preset=6 if level is None else level),
+                           lzma.decompress)
+
+
+class DepthChunkHeader(NamedTuple):
+    width: int
+    height: int
+    dtype: np.dtype
+    scale: float
+    offset: float
+    near: float
+    far: float
+    min_code: int
+    invalid_value: int
+    filter: str
+    codec: str
+    flags: int = 0
+    version: int = DEPTH_CHUNK_VERSION
+
+    def pack(self) -> bytes:
+        dtype_id = next(key for key, value in DTYPES.items() if value == self.dtype)
+        return struct.pack(HEADER_FORMAT, DEPTH_CHUNK_MAGIC, self.version, dtype_id, FILTERS[self.filter],
+                           CODECS[self.codec].id, self.flags, self.width, self.height, self.scale,
+                           self.offset, self.near, self.far, self.min_code, self.invalid_value)
+
+    @classmethod
+    def unpack(cls, data) -> "DepthChunkHeader":
+        (magic, version, dtype_id, filter_id, codec_id, flags, width, height, scale, offset,
+         near, far, min_code, invalid_value) = struct.unpack_from(HEADER_FORMAT, data)
+        if magic != DEPTH_CHUNK_MAGIC:
+            raise ValueError("Not a versioned depth chunk")
+        if version > DEPTH_CHUNK_VERSION:
+            raise ValueError(f"Unsupported depth chunk version {version}")
+
+        filter_name = next((name for name, key in FILTERS.items() if key == filter_id), None)
+        codec_name = next((name for name, codec in CODECS.items() if codec.id == codec_id), None)
+        if dtype_id not in DTYPES or filter_name is None:
+            raise ValueError("Corrupt depth chunk header")
+        if codec_name is None:
+            raise ValueError(f"Depth chunk codec {codec_id} is not available")
+
+        return cls(width, height, DTYPES[dtype_id], scale, offset, near, far, min_code, invalid_value,
+                   filter_name, codec_name, flags, version)
+
+    def to_metres(self, codes: np.ndarray) -> np.ndarray:
+        """Float32 metres, with NaN where the code is `invalid_value`."""
+        depth = (codes.astype(np.float32) - self.min_code) * self.scale + self.offset
+        depth[codes == self.invalid_value] = np.nan
+        return depth
+
+
+def is_versioned(data) -> bool:
+    return bytes(data[:2]) == DEPTH_CHUNK_MAGIC
+
+
+def apply_filter(codes: np.ndarray, filter_name: str) -> np.ndarray:
+    """PNG-style prediction: residuals against the left ("sub") or upper ("up") neighbour, modulo 2**bits."""
+    if filter_name == "none":
+        return codes
+    residual = codes.copy()
+    if filter_name == "sub":
+        np.subtract(codes[:, 1:], codes[:, :-1], out=residual[:, 1:])
+    elif filter_name == "up":
+        np.subtract(codes[1:], codes[:-1], out=residual[1:])
+    else:
+        raise ValueError(f"Unknown depth filter {filter_name!r}; expected one of {list(FILTERS)}")
+    return residual
+
+
+def undo_filter(residual: np.ndarray, filter_name: str) -> np.ndarray:
+    """Invert apply_filter with a wrapping cumulative sum."""
+    if filter_name == "none":
+        return residual
+    axis = 1 if filter_name == "sub" else 0
+    return np.cumsum(residual, axis=axis, dtype=residual.dtype)
+
+
+def _encode_block(codes: np.ndarray, filter_name: str, codec: str, level: Optional[int], byte_planes: bool) -> bytes:
+    residual = apply_filter(np.ascontiguousarray(codes), filter_name).astype(codes.dtype.newbyteorder('<'), copy=False)
+    if byte_planes:
+        payload = residual.view(np.uint8).reshape(-1, 2).T.tobytes()
+    else:
+        payload = residual.tobytes()
+    return CODECS[codec].compress(payload, level)
+
+
+def _decode_block(data, header: "DepthChunkHeader", height: int, width: int) -> np.ndarray:
+    raw = CODECS[header.codec].decompress(data)
+
+    dtype = header.dtype.newbyteorder('<')
+    count = width * height
+    if len(raw) != count * dtype.itemsize:
+        raise ValueError("Depth chunk size does not match its header")
+
+    if header.flags & FLAG_BYTE_PLANES:
+        planes = np.frombuffer(raw, dtype=np.uint8).reshape(dtype.itemsize, count)
+        residual = np.ascontiguousarray(planes.T).view(dtype)
+    else:
+        residual = np.frombuffer(raw, dtype=dtype)
+
+    residual = residual.reshape(height, width).astype(header.dtype, copy=False)
+    return undo_filter(residual, header.filter)
+
+
+class TileLayout(NamedTuple):
+    """Tile grid of a tiled depth payload and where each compressed tile lives in it."""
+    tile_width: int
+    tile_height: int
+    columns: int
+    rows: int
+    offsets: np.ndarray  # rows * columns + 1 payload offsets; tile i spans offsets[i]:offsets[i + 1]
+
+    @property
+    def table_size(self) -> int:
+        return TILE_HEADER_SIZE + 4 * len(self.offsets)
+
+    def tiles_in(self, x: int, y: int, width: int, height: int) -> Iterator[Tuple[int, int]]:
+        """(row, column) of every tile intersecting the rectangle."""
+        for row in range(y // self.tile_height, (y + height - 1) // self.tile_height + 1):
+            for column in range(x // self.tile_width, (x + width - 1) // self.tile_width + 1):
+                yield row, column
+
+    @classmethod
+    def unpack(cls, header: "DepthChunkHeader", data) -> "TileLayout":
+        """Parse the tile header and offset table that follow the chunk header."""
+        tile_width, tile_height = struct.unpack_from(TILE_HEADER_FORMAT, data, HEADER_SIZE)
+        columns = -(-header.width // tile_width)
+        rows = -(-header.height // tile_height)
+        offsets = np.frombuffer(data, dtype='>u4', count=rows * columns + 1, offset=HEADER_SIZE + TILE_HEADER_SIZE)
+        return cls(tile_width, tile_height, columns, rows, offsets.astype(np.int64))
+
+
+def encode_depth_chunk(codes: np.ndarray, quantizer, filter: str = "up", codec: str = "zlib",
+                       level: Optional[int] = None, byte_planes: bool = False,
+                       tile_size: Optional[int] = None) -> bytes:
+    """
+    Serialize quantized depth (uint8 or uint16 codes from a DepthQuantizer) as a versioned dEPh payload.
+
+    The quantizer's range and code mapping go in the header, so readers can recover
+    metres without knowing the capture settings. Row prediction pays off on smooth
+    depth (ToF); SGBM depth only takes a few hundred distinct codes and compresses
+    best unfiltered (see _benchmark).
+
+    With tile_size the codes are cut into tile_size x tile_size tiles that are
+    filtered and compressed independently behind an offset table, so regions can
+    be read without inflating the whole map (see read_depth_region).
+    """
+    if codes.ndim != 2 or codes.dtype not in DTYPES.values():
+        raise ValueError("Depth codes must be a 2D uint8 or uint16 array")
+    if codec not in CODECS:
+        raise ValueError(f"Unknown depth codec {codec!r}; expected one of {list(CODECS)}")
+
+    byte_planes = byte_planes and codes.dtype.itemsize == 2
+    flags = (FLAG_BYTE_PLANES if byte_planes else 0) | (FLAG_TILED if tile_size else 0)
+    header = DepthChunkHeader(codes.shape[1], codes.shape[0], codes.dtype, quantizer.scale, quantizer.offset,
+                              quantizer.near, quantizer.far, quantizer.min_code, quantizer.invalid_value,
+                              filter, codec, flags, version=2 if tile_size else 1)
+
+    if not tile_size:
+        return header.pack() + _encode_block(codes, filter, codec, level, byte_planes)
+
+    height, width = codes.shape
+    tiles = [_encode_block(codes[y:y + tile_size, x:x + tile_size], filter, codec, level, byte_planes)
+             for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+    offsets = np.zeros(len(tiles) + 1, dtype='>u4')
+    np.cumsum([len(tile) for tile in tiles], out=offsets[1:])
+
+    return b''.join([header.pack(), struct.pack(TILE_HEADER_FORMAT, tile_size, tile_size), offsets.tobytes()] + tiles)
+
+
+def decode_depth_chunk(data) -> Tuple[DepthChunkHeader, np.ndarray]:
+    """Parse a versioned dEPh payload into its header and the (height, width) code array."""
+    header = DepthChunkHeader.unpack(data)
+    view = memoryview(data)
+    if not header.flags & FLAG_TILED:
+        return header, _decode_block(view[HEADER_SIZE:], header, header.height, header.width)
+
+    layout = TileLayout.unpack(header, data)
+    base = HEADER_SIZE + layout.table_size
+    codes = np.empty((header.height, header.width), dtype=header.dtype)
+    for row, column in layout.tiles_in(0, 0, header.width, header.height):
+        codes[_tile_slice(header, layout, row, column)] = _decode_tile(view, base, header, layout, row, column)
+    return header, codes
+
+
+def _tile_slice(header: DepthChunkHeader, layout: TileLayout, row: int, column: int) -> Tuple[slice, slice]:
+    y, x = row * layout.tile_height, column * layout.tile_width
+    return (slice(y, min(y + layout.tile_height, header.height)), slice(x, min(x + layout.tile_width, header.width)))
+
+
+def _decode_tile(view, base: int, header: DepthChunkHeader, layout: TileLayout, row: int, column: int) -> np.ndarray:
+    i = row * layout.columns + column
+    rows, columns = _tile_slice(header, layout, row, column)
+    data = view[base + layout.offsets[i]:base + layout.offsets[i + 1]]
+    return _decode_block(data, header, rows.stop - rows.start, columns.stop - columns.start)
+
+
+def split_depth_payload(payload: bytes, max_size: int = MAX_CHUNK_PAYLOAD) -> List[bytes]:
+    """Cut a depth payload into pieces stored as consecutive dEPh chunks."""
+    return [payload[i:i + max_size] for i in range(0, len(payload), max_size)] or [b'']
+
+
+def decode_legacy_depth_chunk(data, width: int, height: int) -> np.ndarray:
+    """Unversioned dEPh payload: zlib-compressed uint8 codes, one per pixel."""
+    raw = zlib.decompress(data)
+    if len(raw) != width * height:
+        raise ValueError("Depth chunk size does not match the image dimensions")
+    return np.frombuffer(raw, dtype=np.uint8).reshape(height, width)
+
+
+class _ChunkReader:
+    """Random access to the logical payload formed by one or more consecutive chunks of a type."""
+
+    def __init__(self, f, chunks):
+        self.f = f
+        self.chunks = chunks
+        self.starts = np.cumsum([0] + [chunk.length for chunk in chunks])
+
+    @property
+    def size(self) -> int:
+        return int(self.starts[-1])
+
+    def read(self, start: int, length: int) -> bytes:
+        parts = []
+        i = int(np.searchsorted(self.starts, start, side='right')) - 1
+        while length > 0 and i < len(self.chunks):
+            skip = start - int(self.starts[i])
+            step = min(length, self.chunks[i].length - skip)
+            self.f.seek(self.chunks[i].data_offset + skip)
+            parts.append(self.f.read(step))
+            start += step
+            length -= step
+            i += 1
+        return b''.join(parts)
+
+
+def read_depth_chunk(filename: str, chunk_type: bytes = DEPTH_CHUNK_TYPE,
+                     use_mmap: bool = False) -> Tuple[Optional[DepthChunkHeader], np.ndarray]:
+    """
+    Return (header, codes) for a PNG's depth chunk; header is None for legacy chunks.
+
+    The chunk is located through the cached chunk index, which also supplies the
+    image size for legacy chunks. With use_mmap the compressed payload is inflated
+    straight from a read-only mapping of the file instead of being read into memory
+    first. Arrays may be read-only views of the decompressed buffer.
+    """
+    index = get_chunk_index(filename)
+    chunks = index.find_all(chunk_type)
+    if not chunks:
+        raise ValueError(f"Chunk type {chunk_type.decode('utf-8')} not found in the PNG file.")
+
+    def decode(data):
+        if is_versioned(data):
+            return decode_depth_chunk(data)
+        return None, decode_legacy_depth_chunk(data, index.width, index.height)
+
+    with open(filename, 'rb') as f:
+        if len(chunks) > 1:
+            # Split payload: stitch the pieces back together
+            reader = _ChunkReader(f, chunks)
+            return decode(reader.read(0, reader.size))
+        if not use_mmap:
+            return decode(read_chunk_data(f, chunks[0]))
+
+        chunk = chunks[0]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return decode(view[chunk.data_offset:chunk.data_offset + chunk.length])
+
+
+def read_depth_region(filename: str, rect: Tuple[int, int, int, int],
+                      chunk_type: bytes = DEPTH_CHUNK_TYPE) -> Tuple[Optional[DepthChunkHeader], np.ndarray]:
+    """
+    Return (header, codes) for the (x, y, width, height) rectangle of a PNG's depth map.
+
+    For tiled payloads only the offset table and the tiles intersecting the
+    rectangle are read and inflated. Other layouts fall back to decoding the whole
+    map. The rectangle is clipped to the image.
+    """
+    index = get_chunk_index(filename)
+    chunks = index.find_all(chunk_type)
+    if not chunks:
+        raise ValueError(f"Chunk type {chunk_type.decode('utf-8')} not found in the PNG file.")
+
+    with open(filename, 'rb') as f:
+        reader = _ChunkReader(f, chunks)
+        prefix = reader.read(0, HEADER_SIZE + TILE_HEADER_SIZE)
+        if not is_versioned(prefix) or not DepthChunkHeader.unpack(prefix).flags & FLAG_TILED:
+            header, codes = read_depth_chunk(filename, chunk_type)
+            x, y, width, height = _clip_rect(rect, codes.shape[1], codes.shape[0])
+            return header, codes[y:y + height, x:x + width]
+
+        header = DepthChunkHeader.unpack(prefix)
+        x, y, width, height = _clip_rect(rect, header.width, header.height)
+
+        tile_width, tile_height = struct.unpack_from(TILE_HEADER_FORMAT, prefix, HEADER_SIZE)
+        tile_count = -(-header.width // tile_width) * -(-header.height // tile_height)
+        table = reader.read(0, HEADER_SIZE + TILE_HEADER_SIZE + (tile_count + 1) * 4)
+        layout = TileLayout.unpack(header, table)
+        base = len(table)
+
+        region = np.empty((height, width), dtype=header.dtype)
+        if not width or not height:
+            return header, region
+
+        for row, column in layout.tiles_in(x, y, width, height):
+            i = row * layout.columns + column
+            start, end = int(layout.offsets[i]), int(layout.offsets[i + 1])
+            rows, columns = _tile_slice(header, layout, row, column)
+            tile = _decode_block(reader.read(base + start, end - start), header,
+                                 rows.stop - rows.start, columns.stop - columns.start)
+
+            # Copy the overlap of tile and rectangle into the region
+            top, bottom = max(rows.start, y), min(rows.stop, y + height)
+            left, right = max(columns.start, x), min(columns.stop, x + width)
+            region[top - y:bottom - y, left - x:right - x] = \
+                tile[top - rows.start:bottom - rows.start, left - columns.start:right - columns.start]
+        return header, region
+
+
+def _clip_rect(rect, image_width: int, image_height: int) -> Tuple[int, int, int, int]:
+    x, y, width, height = rect
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(image_width, x + width), min(image_height, y + height)
+    return left, top, max(0, right - left), max(0, bottom - top)
+
+
+def build_depth_pyramid(codes: np.ndarray, invalid_value: int = 0, levels: int = 3) -> List[np.ndarray]:
+    """
+    Depth codes at 1/2, 1/4, ... resolution (`levels` levels) by block mean over valid pixels.
+
+    Invalid pixels are left out of each mean instead of being blurred in, as
+    cv2.pyrDown would do; a block with no valid pixels stays invalid. Each level is
+    computed from the exact sums and counts of the one before, so every level
+    is the rounded mean of the full-resolution pixels it covers.
+    """
+    valid = codes != invalid_value
+    sums = np.where(valid, codes, 0).astype(np.float64)
+    counts = valid.astype(np.int64)
+
+    pyramid = []
+    for _ in range(levels):
+        height, width = sums.shape
+        if height < 2 or width < 2:
+            break
+        # Pad odd sizes with empty pixels, then sum each 2x2 block
+        pad = ((0, height % 2), (0, width % 2))
+        sums = np.pad(sums, pad).reshape(-(-height // 2), 2, -(-width // 2), 2).sum(axis=(1, 3))
+        counts = np.pad(counts, pad).reshape(sums.shape[0], 2, sums.shape[1], 2).sum(axis=(1, 3))
+
+        # Round into a separate array; the exact sums and counts feed the next level
+        means = np.zeros(sums.shape)
+        np.divide(sums, counts, out=means, where=counts > 0)
+        level = np.full(sums.shape, invalid_value, dtype=codes.dtype)
+        np.copyto(level, np.rint(means), casting="unsafe", where=counts > 0)
+        pyramid.append(level)
+    return pyramid
+
+
+def encode_depth_pyramid(codes: np.ndarray, quantizer, levels: int = 3, filter: str = "up",
+                         codec: str = "zlib", level: Optional[int] = None) -> List[bytes]:
+    """Versioned payloads for each pyramid level, written as dEPm chunks alongside dEPh."""
+    return [encode_depth_chunk(reduced, quantizer, filter, codec, level)
+            for reduced in build_depth_pyramid(codes, quantizer.invalid_value, levels)]
+
+
+def read_depth_preview(filename: str, width: int, height: int) -> Tuple[Optional[DepthChunkHeader], np.ndarray]:
+    """
+    Return (header, codes) of the smallest stored depth level at least width x height.
+
+    Only the headers of the dEPm levels are read to choose one. When no level is
+    large enough, or the file has none, the full-resolution dEPh chunk is decoded.
+    """
+    index = get_chunk_index(filename)
+    best = None
+    with open(filename, 'rb') as f:
+        for chunk in index.find_all(DEPTH_LEVEL_CHUNK_TYPE):
+            f.seek(chunk.data_offset)
+            header = DepthChunkHeader.unpack(f.read(HEADER_SIZE))
+            if header.width >= width and header.height >= height:
+                if best is None or header.width * header.height < best[0].width * best[0].height:
+                    best = (header, chunk)
+
+        if best is not None:
+            return decode_depth_chunk(read_chunk_data(f, best[1]))
+    return read_depth_chunk(filename)
+
+
+def _benchmark(pairs=(("left_image.png", "right_image.png"), ("left_image_2.png", "right_image_2.png"),
+                      ("left_image_3.png", "right_image_3.png")), directory="test_images", repeats=3):
+    """Size and encode/decode time of the legacy uint8 zlib chunk vs. the versioned format per codec."""
+    import os
+    import time
+    import cv2
+    from depth import DepthConverter, DepthQuantizer, compute_disparity
+    from depth.engine import BASELINE, FOCAL_LENGTH
+
+    quantizer = DepthQuantizer(0.3, 10.0, dtype=np.uint16)
+    legacy_quantizer = DepthQuantizer(0.3, 10.0, dtype=np.uint8)
+    converter = DepthConverter(FOCAL_LENGTH, BASELINE)
+
+    variants = [(f"{codec_name} {filter_name}", filter_name, codec_name, None, False)
+                for codec_name in CODECS if codec_name != "none" for filter_name in ("none", "up", "sub")]
+    variants += [("zlib 1 none", "none", "zlib", 1, False), ("zlib up planes", "up", "zlib", None, True)]
+
+    def timed(fn):
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    for left_name, right_name in pairs:
+        left = cv2.imread(os.path.join(directory, left_name), cv2.IMREAD_GRAYSCALE)
+        right = cv2.imread(os.path.join(directory, right_name), cv2.IMREAD_GRAYSCALE)
+        if left is None or right is None:
+            print(f"Skipping {left_name}/{right_name}: not found")
+            continue
+
+        depth, valid = converter.convert(compute_disparity(left, right))
+        codes = quantizer.quantize(depth, valid)
+        legacy_codes = legacy_quantizer.quantize(depth, valid)
+        raw_size = codes.nbytes
+
+        print(f"\n{left_name} + {right_name}: {codes.shape[1]}x{codes.shape[0]}, {valid.mean():.0%} valid")
+        print(f"{'format':<20}{'size (KB)':>12}{'ratio':>8}{'encode (ms)':>14}{'decode (ms)':>14}")
+
+        encode_time, legacy = timed(lambda: zlib.compress(legacy_codes.tobytes()))
+        decode_time, _ = timed(lambda: np.frombuffer(zlib.decompress(legacy), np.uint8).reshape(codes.shape))
+        print(f"{'legacy uint8 zlib':<20}{len(legacy) / 1024:>12.0f}{raw_size / len(legacy):>8.1f}"
+              f"{encode_time * 1000:>14.1f}{decode_time * 1000:>14.1f}")
+
+        for name, filter_name, codec_name, level, byte_planes in variants:
+            encode_time, chunk = timed(lambda: encode_depth_chunk(codes, quantizer, filter_name, codec_name,
+                                                                  level, byte_planes))
+            decode_time, (_, decoded) = timed(lambda: decode_depth_chunk(chunk))
+            assert np.array_equal(decoded, codes)
+            print(f"{'uint16 ' + name:<20}{len(chunk) / 1024:>12.0f}{raw_size / len(chunk):>8.1f}"
+                  f"{encode_time * 1000:>14.1f}{decode_time * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    _benchmark()
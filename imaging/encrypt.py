@@ -1,43 +1,21 @@
 from datetime import datetime
 import hashlib
+import os
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
 from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
 from binascii import hexlify, unhexlify
-from imaging.send_to_db import send_image_data
-from imaging.png import PngInteractor
+from imaging.send_to_db import get_client, send_image_data
+from imaging.hashing import hash_file
+from imaging.keys import PRIVATE_KEY_FILE_NAME, PUBLIC_KEY_FILE_NAME, key_manager, load_private_key, load_public_key
+from imaging.png import PngInteractor, get_chunk_index, read_chunk_data
+from imaging.verify import verify_png
 
 import sys
 
 # Constants
-PRIVATE_KEY_FILE_NAME = "shadow/private_key.pem"
-PUBLIC_KEY_FILE_NAME = "shadow/public_key.pem"
-
-def load_private_key(file_path: str) -> rsa.RSAPrivateKey:
-    """Load an RSA private key from a PEM file."""
-    try:
-        with open(file_path, 'r') as key_file:
-            pem_data = key_file.read()
-            private_key_bytes = pem_data.encode("utf-8")
-            private_key: rsa.RSAPrivateKey = load_pem_private_key(private_key_bytes, None)
-            if not isinstance(private_key, rsa.RSAPrivateKey):
-                raise ValueError("Not an RSA private key")
-            return private_key
-    except Exception as e:
-        raise Exception(f"Error reading private key file: {str(e)}")
-
-def load_public_key(file_path: str) -> rsa.RSAPublicKey:
-    """Load an RSA public key from a PEM file."""
-    try:
-        with open(file_path, 'rb') as key_file:
-            pem_data = key_file.read()
-            public_key = load_pem_public_key(pem_data)
-            if not isinstance(public_key, rsa.RSAPublicKey):
-                raise ValueError("Not an RSA public key")
-            return public_key
-    except Exception as e:
-        raise Exception(f"Error reading public key file: {str(e)}")
+UPLOADED_DIRECTORY = "gallery/uploaded"
 
 def sign_message(private_key: rsa.RSAPrivateKey, message: bytes) -> bytes:
     """Sign a message using the private key."""
@@ -71,11 +49,58 @@ def hash_image_sha256(data: bytes) -> bytes:
     hasher.update(data)
     return hasher.digest()
 
+def hash_unsigned_png(filename: str) -> bytes:
+    """
+    SHA256 of a signed PNG as it was before its Signature chunk was added.
+
+    The file is streamed around the signature chunk, never loaded whole. Files
+    signed in canonical mode hash only their image-content chunks.
+    """
+    index = get_chunk_index(filename)
+    signature_chunk = index.find_text('Signature')
+    skip = (signature_chunk.offset, signature_chunk.end) if signature_chunk is not None else None
+
+    canonical = False
+    hash_mode_chunk = index.find_text('HashMode')
+    if hash_mode_chunk is not None:
+        with open(filename, 'rb') as f:
+            canonical = read_chunk_data(f, hash_mode_chunk).endswith(b'\x00canonical')
+    return hash_file(filename, canonical=canonical, skip=skip)
+
+def upload_signed_png(filename: str):
+    """Verify and upload a PNG signed at capture time, then move it to the uploaded gallery."""
+    interactor = PngInteractor(filename)
+    signature = interactor.find_signature_metadata()
+    if not signature:
+        raise Exception("Could not find signature in metadata")
+
+    image_hash = hash_unsigned_png(filename)
+    public_key = key_manager.public_key()
+    if not verify_signature(public_key, image_hash, unhexlify(signature)):
+        raise Exception("Signature Verification Failed ✗")
+    print("\nSignature Verified ✓")
+
+    # Streamed from disk over the shared keep-alive client
+    response, upload_response = get_client().upload(image_hash, signature, filename)
+    if not response.ok or not upload_response.ok:
+        raise Exception(f"Upload failed: server replied {response.status_code}/{upload_response.status_code}")
+    print("Uploaded image successfully.")
+
+    # The signed file is already final, so moving it is a rename, not a rewrite
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = os.path.join(UPLOADED_DIRECTORY, f"done_{timestamp}.png")
+    os.replace(filename, output_filename)
+    return output_filename
+
 def sign_png(filename: str):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_filename = f"gallery/uploaded/done_{timestamp}.png"
     
     try:
+        # Captures written by the artifact writer are already signed
+        if get_chunk_index(filename).find_text('Signature') is not None:
+            return upload_signed_png(filename)
+
         # Create PNG interactor for the input image
         png_creation_interactor = PngInteractor(filename)
 
@@ -88,7 +113,7 @@ def sign_png(filename: str):
         # print(f"Image hash (bytes array): {list(image_hash)}")
 
         # Load private key and sign the hash
-        private_key = load_private_key(PRIVATE_KEY_FILE_NAME)
+        private_key = key_manager.private_key()
         signed_bytes = sign_message(private_key, image_hash)  # Pass bytes directly
         # print(f"SIGNED MESSAGE: {hexlify(signed_bytes).decode()}\n")
 
@@ -100,31 +125,14 @@ def sign_png(filename: str):
             output_filename
         )
         print("Signature added to file metadata")
-        print("\n-----------READING METADATA-----------\n")
-
-        
-        # Read and verify the signature
-        png_reader_interactor = PngInteractor(output_filename)
-        png_reader_interactor.read_all_metadata()
-
-        signature = png_reader_interactor.find_signature_metadata()
-        if not signature:
-            raise Exception("Could not find signature in metadata")
 
-        signature_bytes = unhexlify(signature)
-
-        # Load public key and verify signature
-        public_key = load_public_key(PUBLIC_KEY_FILE_NAME)
-        
-        # Print verification data for debugging
-        print(f"\nVerifying signature using the following data:")
-        # print(f"Original hash: {hexlify(image_hash).decode()}")
-        # print(f"Signature: {hexlify(signature_bytes).decode()}")
-        
-        if verify_signature(public_key, image_hash, signature_bytes):
+        # Check the written file end to end, reading only its chunk index and signature
+        signature = hexlify(signed_bytes).decode()
+        result = verify_png(output_filename, key_manager.public_key())
+        if result.status == "valid":
             print("\nSignature Verified ✓")
         else:
-            print("\nSignature Verification Failed ✗")
+            print(f"\nSignature Verification Failed ✗ ({result.status})")
         
         send_image_data(image_hash, signature, png_creation_interactor.image_bytes)
 
@@ -0,0 +1,134 @@
+import hashlib
+import struct
+from typing import Optional
+
+from imaging.png import PNG_SIGNATURE
+
+# Chunks that carry the image content itself; metadata such as tEXt is excluded
+CANONICAL_CHUNK_TYPES = frozenset((b'IHDR', b'IDAT', b'dEPh', b'dEPm'))
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class HashingWriter:
+    """
+    File-like object that feeds SHA256 with everything written through it.
+
+    Data is passed on to `raw` (when given) unchanged. With canonical=True only the
+    IHDR, IDAT and depth (dEPh, dEPm) chunks are hashed (length, type, data and CRC), so the hash
+    is unaffected by metadata chunks, including the signature itself. Chunk
+    boundaries are tracked across writes of any size.
+    """
+
+    def __init__(self, raw=None, canonical: bool = False):
+        self.raw = raw
+        self.canonical = canonical
+        self.bytes_written = 0
+        self._hasher = hashlib.sha256()
+
+        # Canonical-mode parser state
+        self._signature_left = len(PNG_SIGNATURE)
+        self._header = b''
+        self._chunk_left = 0
+        self._include_chunk = False
+
+    def write(self, data) -> int:
+        if self.raw is not None:
+            self.raw.write(data)
+
+        view = memoryview(data).cast('B')
+        self.bytes_written += len(view)
+        if self.canonical:
+            self._update_canonical(view)
+        else:
+            self._hasher.update(view)
+        return len(view)
+
+    def _update_canonical(self, view: memoryview) -> None:
+        pos = 0
+        while pos < len(view):
+            if self._signature_left:
+                step = min(self._signature_left, len(view) - pos)
+                self._signature_left -= step
+                pos += step
+            elif self._chunk_left == 0:
+                # Collect the 8-byte length/type header, which may span writes
+                needed = 8 - len(self._header)
+                self._header += bytes(view[pos:pos + needed])
+                pos += needed
+                if len(self._header) == 8:
+                    length, chunk_type = struct.unpack('>I4s', self._header)
+                    self._include_chunk = chunk_type in CANONICAL_CHUNK_TYPES
+                    if self._include_chunk:
+                        self._hasher.update(self._header)
+                    self._chunk_left = length + 4  # Data and CRC
+                    self._header = b''
+            else:
+                step = min(self._chunk_left, len(view) - pos)
+                if self._include_chunk:
+                    self._hasher.update(view[pos:pos + step])
+                self._chunk_left -= step
+                pos += step
+
+    def copy(self) -> "HashingWriter":
+        """Independent hashing state (without the raw stream) for hashing a different ending."""
+        clone = HashingWriter.__new__(HashingWriter)
+        clone.__dict__.update(self.__dict__)
+        clone.raw = None
+        clone._hasher = self._hasher.copy()
+        return clone
+
+    def digest(self) -> bytes:
+        return self._hasher.digest()
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest()
+
+    def flush(self) -> None:
+        if self.raw is not None:
+            self.raw.flush()
+
+
+class HashingReader:
+    """File-like wrapper that hashes everything read from `raw`, e.g. while uploading."""
+
+    def __init__(self, raw, canonical: bool = False):
+        self.raw = raw
+        self._writer = HashingWriter(canonical=canonical)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self._writer.write(data)
+        return data
+
+    @property
+    def bytes_read(self) -> int:
+        return self._writer.bytes_written
+
+    def digest(self) -> bytes:
+        return self._writer.digest()
+
+    def hexdigest(self) -> str:
+        return self._writer.hexdigest()
+
+
+def hash_file(filename: str, canonical: bool = False, skip: Optional[tuple] = None) -> bytes:
+    """
+    SHA256 of a file, streamed in blocks.
+
+    `skip` is an optional (start, end) byte range left out of the hash, e.g. a chunk
+    added after the hash was taken.
+    """
+    writer = HashingWriter(canonical=canonical)
+    with open(filename, 'rb') as f:
+        ranges = [(0, None)] if skip is None else [(0, skip[0]), (skip[1], None)]
+        for start, end in ranges:
+            f.seek(start)
+            remaining = end - start if end is not None else None
+            while remaining is None or remaining > 0:
+                block = f.read(HASH_BLOCK_SIZE if remaining is None else min(HASH_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                writer.write(block)
+                if remaining is not None:
+                    remaining -= len(block)
+    return writer.digest()
@@ -0,0 +1,105 @@
+import os
+import threading
+from typing import Dict, Tuple
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+PRIVATE_KEY_FILE_NAME = "shadow/private_key.pem"
+PUBLIC_KEY_FILE_NAME = "shadow/public_key.pem"
+
+
+def load_private_key(file_path: str) -> rsa.RSAPrivateKey:
+    """Load an RSA private key from a PEM file."""
+    try:
+        with open(file_path, 'r') as key_file:
+            pem_data = key_file.read()
+            private_key_bytes = pem_data.encode("utf-8")
+            private_key: rsa.RSAPrivateKey = load_pem_private_key(private_key_bytes, None)
+            if not isinstance(private_key, rsa.RSAPrivateKey):
+                raise ValueError("Not an RSA private key")
+            return private_key
+    except Exception as e:
+        raise Exception(f"Error reading private key file: {str(e)}")
+
+def load_public_key(file_path: str) -> rsa.RSAPublicKey:
+    """Load an RSA public key from a PEM file."""
+    try:
+        with open(file_path, 'rb') as key_file:
+            pem_data = key_file.read()
+            public_key = load_pem_public_key(pem_data)
+            if not isinstance(public_key, rsa.RSAPublicKey):
+                raise ValueError("Not an RSA public key")
+            return public_key
+    except Exception as e:
+        raise Exception(f"Error reading public key file: {str(e)}")
+
+def sign_username(private_key: rsa.RSAPrivateKey, message: bytes) -> bytes:
+    """Sign a message using the private key."""
+    try:
+        signature = private_key.sign(
+            message,
+            padding.PKCS1v15(),
+            hashes.SHA256()
+        )
+        return signature
+    except Exception as e:
+        raise Exception(f"Error signing message: {str(e)}")
+
+
+class KeyManager:
+    """
+    Process-lifetime cache of the parsed signing keys.
+
+    Each PEM file is parsed and validated once and re-read only when its mtime or
+    size changes, so rotated keys are picked up without a restart. Username
+    signatures are PKCS1v15 and therefore deterministic, so they are computed once
+    per key and username. All accessors are safe to call from any thread.
+    """
+
+    def __init__(self, private_key_file: str = PRIVATE_KEY_FILE_NAME,
+                 public_key_file: str = PUBLIC_KEY_FILE_NAME):
+        self.private_key_file = private_key_file
+        self.public_key_file = public_key_file
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Tuple[Tuple[int, int], object]] = {}
+        self._username_signatures: Dict[Tuple[Tuple[int, int], str], bytes] = {}
+
+    def _get(self, path: str, loader):
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._keys.get(path)
+            if cached is None or cached[0] != stamp:
+                cached = (stamp, loader(path))
+                self._keys[path] = cached
+            return cached
+
+    def private_key(self) -> rsa.RSAPrivateKey:
+        return self._get(self.private_key_file, load_private_key)[1]
+
+    def public_key(self) -> rsa.RSAPublicKey:
+        return self._get(self.public_key_file, load_public_key)[1]
+
+    def username_signature(self, username: str = "pi") -> bytes:
+        """PKCS1v15 signature of `username` with the current private key."""
+        stamp, private_key = self._get(self.private_key_file, load_private_key)
+        with self._lock:
+            signature = self._username_signatures.get((stamp, username))
+        if signature is None:
+            signature = sign_username(private_key, username.encode("ascii"))
+            with self._lock:
+                # Drop signatures made with a rotated-out key
+                self._username_signatures = {key: value for key, value in self._username_signatures.items()
+                                             if key[0] == stamp}
+                self._username_signatures[(stamp, username)] = signature
+        return signature
+
+    def invalidate(self) -> None:
+        """Forget every cached key, e.g. after replacing key files within one mtime tick."""
+        with self._lock:
+            self._keys.clear()
+            self._username_signatures.clear()
+
+
+key_manager = KeyManager()
@@ -1,162 +1,435 @@
+import mmap
+import os
 import struct
 import zlib
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple, Optional
 from PIL import Image
 import numpy as np
 
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class ChunkInfo(NamedTuple):
+    """Location of one chunk inside a PNG file."""
+    type: bytes
+    offset: int  # Offset of the chunk's length field
+    length: int  # Length of the chunk data
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + 8
+
+    @property
+    def end(self) -> int:
+        """Offset just past the chunk's CRC."""
+        return self.offset + 12 + self.length
+
+
+class ChunkIndex:
+    """
+    Offset, length and type of every chunk in a PNG, built in one pass.
+
+    Chunk payloads are skipped with seek() rather than read, except for the few
+    bytes needed to index IHDR dimensions and tEXt keywords.
+    """
+
+    def __init__(self, chunks: List[ChunkInfo], file_size: int, width: int = 0, height: int = 0,
+                 text_keys: Optional[Dict[str, ChunkInfo]] = None):
+        self.chunks = chunks
+        self.file_size = file_size
+        self.width = width
+        self.height = height
+        self.text_keys = text_keys or {}
+
+        self.by_type: Dict[bytes, List[ChunkInfo]] = {}
+        for chunk in chunks:
+            self.by_type.setdefault(chunk.type, []).append(chunk)
+
+    @classmethod
+    def from_file(cls, f) -> "ChunkIndex":
+        """Index an open binary file positioned anywhere."""
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        f.seek(0)
+
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError("File is not a valid PNG")
+
+        chunks = []
+        text_keys = {}
+        width = height = 0
+        offset = 8
+        while offset + 8 <= file_size:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack('>I4s', header)
+            chunk = ChunkInfo(chunk_type, offset, length)
+            if chunk.end > file_size:
+                raise ValueError(f"Truncated {chunk_type!r} chunk at offset {offset}")
+            chunks.append(chunk)
+
+            if chunk_type == b'IHDR' and length >= 8:
+                width, height = struct.unpack('>II', f.read(8))
+            elif chunk_type == b'tEXt':
+                # Keywords are at most 79 bytes, so this never reads much
+                keyword = f.read(min(length, 80)).split(b'\0', 1)[0]
+                text_keys.setdefault(keyword.decode('latin-1'), chunk)
+
+            if chunk_type == b'IEND':
+                break
+
+            offset = chunk.end
+            f.seek(offset)
+
+        return cls(chunks, file_size, width, height, text_keys)
+
+    @classmethod
+    def from_bytes(cls, data) -> "ChunkIndex":
+        """Index PNG data that is already in memory (bytes, bytearray, mmap or ndarray) without copying it."""
+        view = memoryview(data).cast('B')
+        file_size = len(view)
+        if view[:8] != PNG_SIGNATURE:
+            raise ValueError("File is not a valid PNG")
+
+        chunks = []
+        text_keys = {}
+        width = height = 0
+        offset = 8
+        while offset + 8 <= file_size:
+            length, chunk_type = struct.unpack_from('>I4s', view, offset)
+            chunk = ChunkInfo(chunk_type, offset, length)
+            if chunk.end > file_size:
+                raise ValueError(f"Truncated {chunk_type!r} chunk at offset {offset}")
+            chunks.append(chunk)
+
+            if chunk_type == b'IHDR' and length >= 8:
+                width, height = struct.unpack_from('>II', view, chunk.data_offset)
+            elif chunk_type == b'tEXt':
+                keyword = bytes(view[chunk.data_offset:chunk.data_offset + min(length, 80)]).split(b'\0', 1)[0]
+                text_keys.setdefault(keyword.decode('latin-1'), chunk)
+
+            if chunk_type == b'IEND':
+                break
+            offset = chunk.end
+
+        return cls(chunks, file_size, width, height, text_keys)
+
+    def find(self, chunk_type: bytes) -> Optional[ChunkInfo]:
+        """First chunk of `chunk_type`, or None."""
+        chunks = self.by_type.get(chunk_type)
+        return chunks[0] if chunks else None
+
+    def find_all(self, chunk_type: bytes) -> List[ChunkInfo]:
+        return self.by_type.get(chunk_type, [])
+
+    def find_text(self, key: str) -> Optional[ChunkInfo]:
+        """The first tEXt chunk whose keyword is `key`, or None."""
+        return self.text_keys.get(key)
+
+
+def read_chunk_data(f, chunk: ChunkInfo) -> bytes:
+    """Read just the payload of an indexed chunk from an open file."""
+    f.seek(chunk.data_offset)
+    return f.read(chunk.length)
+
+
+def make_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Serialize one chunk: length, type, data and CRC."""
+    crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return struct.pack('>I', len(data)) + chunk_type + bytes(data) + struct.pack('>I', crc)
+
+
+def make_text_chunk(key: str, value: str) -> bytes:
+    return make_chunk(b'tEXt', f"{key}\0{value}".encode('latin-1'))
+
+
+IEND_CHUNK = make_chunk(b'IEND', b'')
+
+_COPY_BLOCK_SIZE = 1 << 20
+
+
+def _copy_range(src, dst, offset: int, count: int) -> None:
+    """
+    Copy `count` bytes starting at `offset` of file `src` to the current position of `dst`.
+
+    Uses copy_file_range or sendfile so the data never passes through Python, and
+    falls back to copying mmap slices in fixed-size blocks.
+    """
+    dst.flush()
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    dst_offset = dst.tell()
+    done = 0
+
+    try:
+        if hasattr(os, 'copy_file_range'):
+            while done < count:
+                copied = os.copy_file_range(src_fd, dst_fd, count - done, offset + done, dst_offset + done)
+                if copied == 0:
+                    break
+                done += copied
+        elif hasattr(os, 'sendfile'):
+            os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+            while done < count:
+                sent = os.sendfile(dst_fd, src_fd, offset + done, count - done)
+                if sent == 0:
+                    break
+                done += sent
+    except OSError:
+        pass  # e.g. EXDEV across filesystems; finish with the mmap path
+
+    if done < count:
+        with mmap.mmap(src_fd, 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            dst.seek(dst_offset + done)
+            try:
+                while done < count:
+                    block = min(_COPY_BLOCK_SIZE, count - done)
+                    dst.write(view[offset + done:offset + done + block])
+                    done += block
+            finally:
+                view.release()
+
+    dst.seek(dst_offset + count)
+
+
+def insert_chunks_before_iend(filename: str, chunks: List[bytes], output_filename: Optional[str] = None) -> None:
+    """
+    Insert serialized chunks just before IEND.
+
+    With no output file (or the same path) the file is edited in place by overwriting
+    IEND with the new chunks plus IEND, so only the new chunks are ever in memory.
+    Otherwise the original prefix is copied kernel-side to the new file.
+    """
+    iend = get_chunk_index(filename).find(b'IEND')
+    if iend is None:
+        raise ValueError("PNG file is missing the IEND chunk")
+
+    in_place = output_filename is None or os.path.abspath(output_filename) == os.path.abspath(filename)
+    if in_place:
+        with open(filename, 'r+b') as f:
+            f.seek(iend.offset)
+            for chunk in chunks:
+                f.write(chunk)
+            f.write(IEND_CHUNK)
+            f.truncate()
+        return
+
+    with open(filename, 'rb') as src, open(output_filename, 'wb') as dst:
+        _copy_range(src, dst, 0, iend.offset)
+        for chunk in chunks:
+            dst.write(chunk)
+        dst.write(IEND_CHUNK)
+
+
+def write_png_with_chunks(png_data, chunks: List[bytes], output_filename: str) -> None:
+    """Write in-memory PNG data to a file with extra chunks before IEND, without concatenating buffers."""
+    view = memoryview(png_data).cast('B')
+    iend = ChunkIndex.from_bytes(view).find(b'IEND')
+    if iend is None:
+        raise ValueError("PNG file is missing the IEND chunk")
+
+    with open(output_filename, 'wb') as f:
+        f.write(view[:iend.offset])
+        for chunk in chunks:
+            f.write(chunk)
+        f.write(view[iend.offset:iend.end])
+
+
+class PngEditor:
+    """
+    Chunk-level PNG editor that applies a batch of edits in a single write.
+
+    Edits are located through the chunk index, never by searching the bytes, so a
+    chunk type appearing inside compressed data cannot be mistaken for a real chunk.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.index = get_chunk_index(filename)
+        self._inserts: List[bytes] = []
+        self._replacements: Dict[int, Optional[bytes]] = {}  # Chunk offset -> new chunk, None removes it
+
+    def insert_before_iend(self, chunk_type: bytes, data: bytes) -> "PngEditor":
+        """Queue a new chunk to go right before IEND."""
+        self._inserts.append(make_chunk(chunk_type, data))
+        return self
+
+    def insert_text(self, key: str, value: str) -> "PngEditor":
+        self._inserts.append(make_text_chunk(key, value))
+        return self
+
+    def replace_chunk(self, chunk_type: bytes, data: bytes, keyword: Optional[str] = None) -> "PngEditor":
+        """
+        Replace the first chunk of `chunk_type` (for tEXt, the one with `keyword`) in place.
+
+        If there is no such chunk, the new one is inserted before IEND instead.
+        """
+        if chunk_type in (b'IHDR', b'IEND'):
+            raise ValueError(f"Cannot replace the {chunk_type.decode()} chunk")
+
+        if keyword is not None:
+            existing = self.index.find_text(keyword) if chunk_type == b'tEXt' else None
+        else:
+            existing = self.index.find(chunk_type)
+
+        new_chunk = make_chunk(chunk_type, data)
+        if existing is None or existing.offset in self._replacements:
+            self._inserts.append(new_chunk)
+        else:
+            self._replacements[existing.offset] = new_chunk
+        return self
+
+    def replace_text(self, key: str, value: str) -> "PngEditor":
+        return self.replace_chunk(b'tEXt', f"{key}\0{value}".encode('latin-1'), keyword=key)
+
+    def remove_chunks(self, chunk_type: bytes) -> "PngEditor":
+        """Drop every chunk of `chunk_type`, including ones queued for insertion."""
+        if chunk_type in (b'IHDR', b'IDAT', b'IEND'):
+            raise ValueError(f"Cannot remove {chunk_type.decode()} chunks")
+
+        for chunk in self.index.find_all(chunk_type):
+            self._replacements[chunk.offset] = None
+        self._inserts = [chunk for chunk in self._inserts if chunk[4:8] != chunk_type]
+        return self
+
+    def save(self, output_filename: Optional[str] = None) -> None:
+        """Write all queued edits at once. Without an output file the source is updated."""
+        if not self._replacements:
+            insert_chunks_before_iend(self.filename, self._inserts, output_filename)
+        else:
+            self._rewrite(output_filename)
+
+        self._inserts = []
+        self._replacements = {}
+        self.filename = output_filename or self.filename
+        self.index = get_chunk_index(self.filename)
+
+    def _rewrite(self, output_filename: Optional[str]) -> None:
+        in_place = output_filename is None or os.path.abspath(output_filename) == os.path.abspath(self.filename)
+        target = f"{self.filename}.tmp" if in_place else output_filename
+
+        with open(self.filename, 'rb') as src, open(target, 'wb') as dst:
+            dst.write(PNG_SIGNATURE)
+
+            # Copy unchanged chunks in contiguous runs
+            run_start = run_end = None
+            for chunk in self.index.chunks:
+                if chunk.type == b'IEND':
+                    break
+
+                if chunk.offset not in self._replacements:
+                    if run_end != chunk.offset:
+                        if run_start is not None:
+                            _copy_range(src, dst, run_start, run_end - run_start)
+                        run_start = chunk.offset
+                    run_end = chunk.end
+                    continue
+
+                if run_start is not None:
+                    _copy_range(src, dst, run_start, run_end - run_start)
+                    run_start = run_end = None
+
+                replacement = self._replacements[chunk.offset]
+                if replacement is not None:
+                    dst.write(replacement)
+
+            if run_start is not None:
+                _copy_range(src, dst, run_start, run_end - run_start)
+
+            for chunk in self._inserts:
+                dst.write(chunk)
+            dst.write(IEND_CHUNK)
+
+        if in_place:
+            os.replace(target, self.filename)
+
+
+@lru_cache(maxsize=32)
+def _cached_chunk_index(path: str, device: int, inode: int, mtime_ns: int, size: int) -> ChunkIndex:
+    with open(path, 'rb') as f:
+        return ChunkIndex.from_file(f)
+
+
+def get_chunk_index(filename: str) -> ChunkIndex:
+    """
+    Return the chunk index for a file, reusing it until the file changes.
+
+    The inode is part of the key because a file replaced with os.replace can keep
+    the same size and, within timestamp resolution, the same mtime.
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    return _cached_chunk_index(path, stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
 class PngInteractor:
     def __init__(self, filename: str):
         """Initialize PNG interactor with a filename."""
         self.filename = filename
-        with open(filename, 'rb') as f:
-            self.image_bytes = f.read()
+        self._image_bytes = None
+
+    @property
+    def image_bytes(self) -> bytes:
+        """The whole file, read on first use only."""
+        if self._image_bytes is None:
+            with open(self.filename, 'rb') as f:
+                self._image_bytes = f.read()
+        return self._image_bytes
+
+    @image_bytes.setter
+    def image_bytes(self, value) -> None:
+        self._image_bytes = value
+
+    @property
+    def chunk_index(self) -> ChunkIndex:
+        return get_chunk_index(self.filename)
 
     def add_text_chunk_to_file(self, key: str, value: str, output_filename: str) -> None:
         """Add a text chunk to a PNG file and save to a new file."""
         # Verify the PNG is valid by trying to open it
         Image.open(self.filename).verify()
 
-        # Read original file
-        # with open(self.filename, 'rb') as f:
-        #     data = f.read()
-
-        # Create buffer for new file
-        buffer = bytearray()
-
-        # Write original content up to IEND chunk
-        buffer.extend(self.image_bytes[:-12])  # Skip IEND chunk
-
-        # Create tEXt chunk
-        key_value = f"{key}\0{value}".encode('latin-1')
-        length = len(key_value)
-        
-        # Write length (4 bytes, big-endian)
-        buffer.extend(struct.pack('>I', length))
-        
-        # Write chunk type
-        buffer.extend(b'tEXt')
-        
-        # Write the key-value data
-        buffer.extend(key_value)
-        
-        # Calculate and write CRC
-        crc = zlib.crc32(b'tEXt' + key_value) & 0xFFFFFFFF
-        buffer.extend(struct.pack('>I', crc))
-
-        # Write original IEND chunk
-        buffer.extend(self.image_bytes[-12:])
-
-        # Write to output file
-        with open(output_filename, 'wb') as f:
-            f.write(buffer)
+        # Stream the original up to IEND, then the tEXt chunk and IEND
+        insert_chunks_before_iend(self.filename, [make_text_chunk(key, value)], output_filename)
 
         print(f"Metadata added and image saved as {output_filename}")
 
     def add_text_chunk_to_data(self, key: str, value: str, output_filename: str) -> None:
         """Add a text chunk to image data and save to a new file."""
-        buffer = bytearray()
-
-        # Write original content up to IEND chunk
-        buffer.extend(self.image_bytes[:-12])
-
-        # Create tEXt chunk
-        key_value = f"{key}\0{value}".encode('latin-1')
-        length = len(key_value)
-        
-        # Write length
-        buffer.extend(struct.pack('>I', length))
-        
-        # Write chunk type
-        buffer.extend(b'tEXt')
-        
-        # Write the key-value data
-        buffer.extend(key_value)
-        
-        # Calculate and write CRC
-        crc = zlib.crc32(b'tEXt' + key_value) & 0xFFFFFFFF
-        buffer.extend(struct.pack('>I', crc))
-
-        # Write original IEND chunk
-        buffer.extend(self.image_bytes[-12:])
-
-        self.image_bytes = buffer
-
-        # Write to output file
-        with open(output_filename, 'wb') as f:
-            f.write(buffer)
+        text_chunk = make_text_chunk(key, value)
+
+        if self._image_bytes is not None:
+            write_png_with_chunks(self._image_bytes, [text_chunk], output_filename)
+        else:
+            insert_chunks_before_iend(self.filename, [text_chunk], output_filename)
+
+        # The interactor now refers to the new image; its bytes are re-read lazily
+        self.filename = output_filename
+        self._image_bytes = None
 
         print(f"Metadata added and image saved as {output_filename}")
 
     def read_all_metadata(self) -> None:
         """Read and print all metadata chunks from the PNG file."""
+        index = self.chunk_index
         with open(self.filename, 'rb') as f:
-            # Verify PNG signature
-            png_header = f.read(8)
-            if png_header != b'\x89PNG\r\n\x1a\n':
-                raise ValueError("File is not a valid PNG")
-
-            # Read chunks
-            while True:
-                try:
-                    # Read chunk length
-                    length_bytes = f.read(4)
-                    if not length_bytes:
-                        break
-                    length = struct.unpack('>I', length_bytes)[0]
-
-                    # Read chunk type
-                    chunk_type = f.read(4)
-                    
-                    # Read chunk data
-                    chunk_data = f.read(length)
-                    
-                    # Read CRC
-                    crc = f.read(4)
-
-                    # Process metadata chunks
-                    if chunk_type in [b'tEXt', b'zTXt', b'iTXt']:
-                        print(f"{chunk_type.decode()} chunk: Metadata: {chunk_data}")
-
-                    if chunk_type == b'IEND':
-                        break
-
-                except struct.error:
-                    break
+            for chunk in index.chunks:
+                # Process metadata chunks
+                if chunk.type in [b'tEXt', b'zTXt', b'iTXt']:
+                    chunk_data = read_chunk_data(f, chunk)
+                    print(f"{chunk.type.decode()} chunk: Metadata: {chunk_data}")
 
     def find_signature_metadata(self) -> Optional[str]:
         """Find and return signature metadata if present."""
-        with open(self.filename, 'rb') as f:
-            # Verify PNG signature
-            png_header = f.read(8)
-            if png_header != b'\x89PNG\r\n\x1a\n':
-                raise ValueError("File is not a valid PNG")
+        chunk = self.chunk_index.find_text('Signature')
+        if chunk is None:
+            return None
 
-            while True:
-                try:
-                    length_bytes = f.read(4)
-                    if not length_bytes:
-                        break
-                    length = struct.unpack('>I', length_bytes)[0]
-
-                    chunk_type = f.read(4)
-                    chunk_data = f.read(length)
-                    crc = f.read(4)
-
-                    if chunk_type == b'tEXt':
-                        try:
-                            metadata = chunk_data.decode('latin-1')
-                            if metadata.startswith('Signature\0'):
-                                return metadata[len('Signature\0'):]
-                        except UnicodeDecodeError:
-                            continue
-
-                    if chunk_type == b'IEND':
-                        break
-
-                except struct.error:
-                    break
-
-        return None
+        with open(self.filename, 'rb') as f:
+            metadata = read_chunk_data(f, chunk).decode('latin-1')
+        return metadata[len('Signature\0'):]
 
     def flatten_image(self) -> Tuple[bytes, Tuple[int, int]]:
         """Flatten image to raw RGBA bytes."""
@@ -193,4 +466,68 @@ def create_square_image(side_length: int, output_filename: str) -> None:
                 pixels[x, y] = white
 
     # Save image
-    img.save(output_filename, 'PNG')
\ No newline at end of file
+    img.save(output_filename, 'PNG')
+
+
+def _benchmark(chunk_count=400, chunk_size=64 * 1024, lookups=50):
+    """Signature lookups on a large multi-IDAT PNG: full chunk walk vs. cached chunk index."""
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.mkdtemp(), "large.png")
+    rng = np.random.default_rng(0)
+
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE)
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0)))
+        payload = rng.integers(0, 256, chunk_size, dtype=np.uint8).tobytes()
+        for _ in range(chunk_count):
+            f.write(chunk(b'IDAT', payload))  # Not decodable, but structurally valid
+        f.write(chunk(b'tEXt', b'Signature\0' + b'ab' * 256))
+        f.write(chunk(b'IEND', b''))
+
+    size_mb = os.path.getsize(path) / 1e6
+
+    def walk():
+        with open(path, 'rb') as f:
+            f.read(8)
+            while True:
+                length_bytes = f.read(4)
+                if not length_bytes:
+                    return None
+                length = struct.unpack('>I', length_bytes)[0]
+                chunk_type = f.read(4)
+                chunk_data = f.read(length)
+                f.read(4)
+                if chunk_type == b'tEXt' and chunk_data.startswith(b'Signature\0'):
+                    return chunk_data
+
+    start = time.perf_counter()
+    for _ in range(lookups):
+        walk()
+    walk_time = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        ChunkIndex.from_file(f)
+    build_time = time.perf_counter() - start
+
+    interactor = PngInteractor(path)
+    interactor.find_signature_metadata()
+    start = time.perf_counter()
+    for _ in range(lookups):
+        interactor.find_signature_metadata()
+    cached_time = (time.perf_counter() - start) / lookups
+
+    print(f"{size_mb:.1f} MB, {chunk_count} IDAT chunks")
+    print(f"Full chunk walk:        {walk_time * 1000:.3f} ms per lookup")
+    print(f"Index build (one pass): {build_time * 1000:.3f} ms")
+    print(f"Cached index lookup:    {cached_time * 1000:.3f} ms per lookup")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    _benchmark()
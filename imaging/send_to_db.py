@@ -1,14 +1,24 @@
 import os
 import requests
 import sys
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives.serialization import load_pem_private_key
+import threading
+import uuid
 from binascii import hexlify
+from typing import Optional, Tuple, Union
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from imaging.keys import PRIVATE_KEY_FILE_NAME, key_manager, load_private_key, sign_username
 
 
 BASE_URL = "http://3.133.137.72:5000"
-PRIVATE_KEY_FILE_NAME = "shadow/private_key.pem"
+USERNAME = "pi"
+
+TIMEOUT = (3.05, 60)  # (connect, read) seconds; the read side covers large image bodies
+RETRIES = 3
+BACKOFF_FACTOR = 0.5  # Retries wait 0.5s, 1s, 2s, ...
+RETRY_STATUSES = (502, 503, 504)
+STREAM_BLOCK_SIZE = 64 * 1024
 
 
 # class SSLAdapter(HTTPAdapter):
@@ -19,46 +29,222 @@ PRIVATE_KEY_FILE_NAME = "shadow/private_key.pem"
 #         return super().init_poolmanager(*args, **kwargs)
 
 
-def load_private_key(file_path: str) -> rsa.RSAPrivateKey:
-    """Load an RSA private key from a PEM file."""
-    try:
-        with open(file_path, 'r') as key_file:
-            pem_data = key_file.read()
-            private_key_bytes = pem_data.encode("utf-8")
-            private_key: rsa.RSAPrivateKey = load_pem_private_key(private_key_bytes, None)
-            if not isinstance(private_key, rsa.RSAPrivateKey):
-                raise ValueError("Not an RSA private key")
-            return private_key
-    except Exception as e:
-        raise Exception(f"Error reading private key file: {str(e)}")
-
-def sign_username(private_key: rsa.RSAPrivateKey, message: bytes) -> bytes:
-    """Sign a message using the private key."""
-    try:
-        signature = private_key.sign(
-            message,
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
-        return signature
-    except Exception as e:
-        raise Exception(f"Error signing message: {str(e)}")
-
-def send_image_data(image_hash, image_signature, image_data):
-    url = f"{BASE_URL}/api/image"
-    username = "pi"
-
-    username_bytes = bytes("pi", encoding="ascii")
-    private_key = load_private_key(PRIVATE_KEY_FILE_NAME)
-    username_signature = sign_username(private_key, username_bytes)
-    
-    payload = {
+def _metadata_fields(image_hash: bytes, image_signature: str, username: str = USERNAME):
+    # Parsed key and username signature are cached for the life of the process
+    username_signature = key_manager.username_signature(username)
+    return {
         "encrypted_username": (None, hexlify(username_signature).decode()),
         "username": (None, username),
         "signed_hash": (None, image_hash.hex()),
         "hash_signature": (None, image_signature)
     }
 
+
+class _MultipartFileBody:
+    """
+    multipart/form-data body with text fields and one file part, read lazily from disk.
+
+    Has a length, so requests sends a Content-Length instead of chunked encoding, and
+    supports tell()/seek() so urllib3 can rewind it when retrying.
+    """
+
+    def __init__(self, fields, file_field: str, path: str):
+        self.boundary = uuid.uuid4().hex
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, (_, value) in fields.items())
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                 f'filename="{os.path.basename(path)}"\r\nContent-Type: image/png\r\n\r\n').encode()
+        tail = f'\r\n--{self.boundary}--\r\n'.encode()
+
+        self._parts = [head, path, tail]
+        self._sizes = [len(head), os.path.getsize(path), len(tail)]
+        self._position = 0
+        self._file = None
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return sum(self._sizes)
+
+    def __iter__(self):
+        while True:
+            block = self.read(STREAM_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, position: int, whence: int = 0) -> int:
+        if whence == os.SEEK_CUR:
+            position += self._position
+        elif whence == os.SEEK_END:
+            position += len(self)
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self) - self._position
+        out = []
+        while size > 0 and self._position < len(self):
+            start = 0
+            for part, part_size in zip(self._parts, self._sizes):
+                if self._position < start + part_size:
+                    break
+                start += part_size
+            offset = self._position - start
+            step = min(size, part_size - offset)
+            if isinstance(part, bytes):
+                block = part[offset:offset + step]
+            else:
+                if self._file is None:
+                    self._file = open(part, 'rb')
+                self._file.seek(offset)
+                block = self._file.read(step)
+            if not block:
+                break
+            out.append(block)
+            self._position += len(block)
+            size -= len(block)
+        return b"".join(out)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class UploaderClient:
+    """
+    Keep-alive client for the TrueSight upload endpoints.
+
+    One requests.Session holds a pool of persistent connections, and every request
+    uses a connect/read timeout. Connection failures and 502/503/504 replies are
+    retried with exponential backoff; read errors are not, so a POST the server
+    may have stored is never sent twice. Images given as a path are streamed from
+    disk instead of being read into memory. With combined=True the metadata and the
+    image go to /api/image as one multipart request, instead of a second
+    /api/store_image round trip. This needs server support, so it is off by default.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, timeout=TIMEOUT, retries: int = RETRIES,
+                 backoff_factor: float = BACKOFF_FACTOR, pool_size: int = 4, combined: bool = False):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.combined = combined
+
+        # No read retries: after a read timeout the server may already have stored the
+        # POSTed record, so only connect errors and 502/503/504 replies are retried
+        retry = Retry(total=retries, connect=retries, read=0, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset({"GET", "POST", "PUT"}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url or BASE_URL}{endpoint}"
+
+    def send_metadata(self, image_hash: bytes, image_signature: str) -> requests.Response:
+        return self.session.post(self._url("/api/image"), files=_metadata_fields(image_hash, image_signature),
+                                 timeout=self.timeout)
+
+    def store_image(self, image) -> requests.Response:
+        """POST the image body: bytes, an open file, or a path (streamed from the file)."""
+        if not isinstance(image, str):
+            return self.session.post(self._url("/api/store_image"), data=image, timeout=self.timeout)
+        with open(image, 'rb') as f:
+            return self.session.post(self._url("/api/store_image"), data=f, timeout=self.timeout)
+
+    def upload_combined(self, image_hash: bytes, image_signature: str, path: str) -> requests.Response:
+        body = _MultipartFileBody(_metadata_fields(image_hash, image_signature), "image", path)
+        try:
+            return self.session.post(self._url("/api/image"), data=body, timeout=self.timeout,
+                                     headers={"Content-Type": body.content_type})
+        finally:
+            body.close()
+
+    def start_resumable(self, file_sha256: str, size: int) -> Optional[dict]:
+        """
+        Open (or find again, by file hash) a resumable upload session.
+
+        Returns {"upload_id": ..., "received": bytes already stored}, or None when
+        the server has no resumable endpoint.
+        """
+        response = self.session.post(self._url("/api/uploads"), json={"sha256": file_sha256, "size": size},
+                                     timeout=self.timeout)
+        if response.status_code in (404, 405, 501):
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def resumable_status(self, upload_id: str) -> int:
+        """Bytes of the upload the server has stored so far."""
+        response = self.session.get(self._url(f"/api/uploads/{upload_id}"), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["received"]
+
+    def send_chunk(self, upload_id: str, data: bytes, offset: int, total: int) -> dict:
+        """PUT one chunk at `offset`; the reply of the last chunk acknowledges the stored image."""
+        headers = {"Content-Range": f"bytes {offset}-{offset + len(data) - 1}/{total}"}
+        response = self.session.put(self._url(f"/api/uploads/{upload_id}"), data=data, headers=headers,
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def upload(self, image_hash: bytes, image_signature: str,
+               image: Union[str, bytes]) -> Tuple[requests.Response, requests.Response]:
+        """Send the metadata and the image; returns the (metadata, image) responses."""
+        if self.combined and isinstance(image, str):
+            response = self.upload_combined(image_hash, image_signature, image)
+            return response, response
+
+        response = self.send_metadata(image_hash, image_signature)
+        if not response.ok:
+            return response, response
+        return response, self.store_image(image)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> UploaderClient:
+    """Process-wide client, so every upload shares one connection pool."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = UploaderClient()
+        return _client
+
+
+def send_image_data(image_hash, image_signature, image_data, session=None, base_url=None, verbose=True):
+    """
+    Posts the hash and signatures, then the image itself.
+
+    Requests go through the shared UploaderClient's keep-alive pool unless a
+    session is given. Returns the (metadata, image) responses.
+    """
+    http = session or get_client().session
+    url = f"{base_url or BASE_URL}/api/image"
+
+    payload = _metadata_fields(image_hash, image_signature)
+
     headers = {}
 
     # print(payload)
@@ -66,29 +252,70 @@ def send_image_data(image_hash, image_signature, image_data):
     # session.mount('https://', SSLAdapter())
     # response = session.post(url, files=payload, headers=headers)
 
-    response = requests.post(url, files=payload, headers=headers)
+    response = http.post(url, files=payload, headers=headers, timeout=TIMEOUT)
 
-    print(response.status_code)
-    print(response.text)
+    if verbose:
+        print(response.status_code)
+        print(response.text)
 
     # Upload image itself
-    upload_image(image_data)
+    upload_response = upload_image(image_data, session, base_url, verbose)
+    return response, upload_response
 
 # Endpoint URL (adjust host/port as needed)
 
-def upload_image(image_data):
+def upload_image(image_data, session=None, base_url=None, verbose=True):
     """
     Reads the file at file_path in binary mode and uploads it
     to the Flask endpoint as the request body.
     """
-    url = f"{BASE_URL}/api/store_image"
+    url = f"{base_url or BASE_URL}/api/store_image"
+
+    response = (session or get_client().session).post(url, data=image_data, timeout=TIMEOUT)
 
-    response = requests.post(url, data=image_data)
-    
-    if response.status_code == 200:
+    if verbose and response.status_code == 200:
         print(f"Uploaded image successfully.")
         print("Response:", response.json())
-    else:
+    elif verbose:
         print(f"Failed to upload image.")
         print("Status code:", response.status_code)
         print("Response:", response.text)
+    return response
+
+
+def _benchmark(count=20, size=2 * 1024 * 1024):
+    """Connections opened and time taken: bare requests.post vs. the pooled client, against a stand-in."""
+    import tempfile
+    import time
+    from imaging.standin_server import StandInServer
+
+    path = os.path.join(tempfile.mkdtemp(), "upload.png")
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    image_hash = bytes(32)
+    signature = "00" * 256
+
+    def bare():
+        requests.post(f"{server.base_url}/api/image", files=_metadata_fields(image_hash, signature))
+        with open(path, 'rb') as f:
+            requests.post(f"{server.base_url}/api/store_image", data=f.read())
+
+    print(f"{count} uploads of {size / 1e6:.1f} MB\n")
+    print(f"{'mode':<24}{'requests':>10}{'connections':>13}{'time (s)':>10}")
+    with StandInServer() as server:
+        with UploaderClient(server.base_url) as client, \
+                UploaderClient(server.base_url, combined=True) as combined_client:
+            modes = [("bare requests.post", bare),
+                     ("pooled client", lambda: client.upload(image_hash, signature, path)),
+                     ("pooled, combined", lambda: combined_client.upload(image_hash, signature, path))]
+            for name, upload in modes:
+                server.reset()
+                start = time.perf_counter()
+                for _ in range(count):
+                    upload()
+                elapsed = time.perf_counter() - start
+                print(f"{name:<24}{sum(server.requests.values()):>10}{server.connections:>13}{elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    _benchmark()
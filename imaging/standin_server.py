@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real server behind its proxy
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+    def setup(self):
+        super().setup()
+        # One handler instance per TCP connection; keep-alive requests reuse it
+        self.server.stand_in.record_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _multipart_file(self, body: bytes, name: str):
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("multipart/form-data"):
+            return None
+        # Split on the boundary directly; the email parser is far slower than the uploads
+        boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+        disposition = f'name="{name}"'.encode()
+        for part in body.split(b"--" + boundary)[1:-1]:
+            headers, _, payload = part.partition(b"\r\n\r\n")
+            if disposition in headers:
+                return payload[:-2]  # Drop the CRLF before the next boundary
+        return None
+
+    def _reply(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server: "StandInServer" = self.server.stand_in
+        server.record(self.path, 0)
+        upload = server.uploads.get(self.path.rsplit("/", 1)[-1])
+        if self.path.startswith("/api/uploads/") and upload is not None:
+            self._reply(200, {"received": len(upload["data"])})
+        else:
+            self._reply(404, {"error": f"unknown upload {self.path}"})
+
+    def do_PUT(self):
+        server: "StandInServer" = self.server.stand_in
+        body = self._read_body()
+        server.record(self.path, len(body))
+        upload = server.uploads.get(self.path.rsplit("/", 1)[-1])
+        if not self.path.startswith("/api/uploads/") or upload is None:
+            self._reply(404, {"error": f"unknown upload {self.path}"})
+            return
+
+        # Content-Range: bytes start-end/total; only in-order chunks are accepted
+        start = int(self.headers["Content-Range"].split()[1].split("-")[0])
+        with server._lock:
+            if start != len(upload["data"]):
+                self._reply(409, {"received": len(upload["data"])})
+                return
+            upload["data"] += body
+            received = len(upload["data"])
+
+        if received < upload["size"]:
+            self._reply(200, {"received": received})
+        else:
+            self._reply(200, {"received": received, "status": "stored",
+                              "sha256": hashlib.sha256(upload["data"]).hexdigest()})
+
+    def do_POST(self):
+        server: "StandInServer" = self.server.stand_in
+        body = self._read_body()
+        server.record(self.path, len(body))
+
+        if self.path == "/api/uploads":
+            request = json.loads(body)
+            with server._lock:
+                upload_id = next((key for key, upload in server.uploads.items()
+                                  if upload["sha256"] == request["sha256"]), None)
+                if upload_id is None:
+                    upload_id = uuid.uuid4().hex
+                    server.uploads[upload_id] = {"sha256": request["sha256"], "size": request["size"],
+                                                 "data": bytearray()}
+            self._reply(201, {"upload_id": upload_id, "received": len(server.uploads[upload_id]["data"])})
+        elif self.path == "/api/image":
+            image = self._multipart_file(body, "image")
+            if image is None:
+                self._reply(200, {"status": "ok"})
+            else:
+                # Combined mode: metadata and image in one request
+                self._reply(200, {"status": "stored", "sha256": hashlib.sha256(image).hexdigest()})
+        elif self.path == "/api/store_image":
+            self._reply(200, {"status": "stored", "sha256": hashlib.sha256(body).hexdigest()})
+        else:
+            self._reply(404, {"error": f"unknown endpoint {self.path}"})
+
+
+class StandInServer:
+    """
+    Local stand-in for the /api/image and /api/store_image endpoints, for benchmarks.
+
+    It also implements a resumable upload protocol (POST /api/uploads, then
+    in-order PUT chunks with Content-Range, GET for progress). The real server
+    needs the same endpoints before clients can use it.
+
+    Runs a threaded HTTP/1.1 server on a free port and counts requests and body
+    bytes per endpoint, and the TCP connections accepted, which shows whether clients
+    reuse connections. Use as a context manager; `base_url` replaces BASE_URL.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._httpd = ThreadingHTTPServer((host, port), _StandInHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.bytes_received = 0
+        self.connections = 0
+        self.uploads: Dict[str, dict] = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path: str, size: int) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.bytes_received += size
+
+    def record_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = {}
+            self.bytes_received = 0
+            self.connections = 0
+
+    def start(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,315 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from imaging.batch import prepare_signed
+from imaging.encrypt import UPLOADED_DIRECTORY
+from imaging.hashing import hash_file
+from imaging.send_to_db import UploaderClient
+
+QUEUE_DATABASE = "gallery/upload_queue.sqlite3"
+CHUNK_SIZE = 1024 * 1024  # Resumable uploads send the PNG in 1 MiB PUTs
+RESUMABLE_THRESHOLD = 2 * CHUNK_SIZE  # Smaller files go up in one streamed request
+BASE_DELAY = 5.0  # Seconds before the first retry; doubles per failure
+MAX_DELAY = 15 * 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending, uploading, done, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    image_hash TEXT,
+    signature TEXT,
+    file_sha256 TEXT,
+    metadata_sent INTEGER NOT NULL DEFAULT 0,
+    upload_id TEXT,
+    bytes_sent INTEGER NOT NULL DEFAULT 0,
+    uploaded_path TEXT,
+    last_error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+class PermanentUploadError(Exception):
+    """An upload that retrying cannot fix, e.g. a bad signature or a vanished file."""
+
+
+class RateLimiter:
+    """Token bucket shared by the upload workers, capping total bytes per second."""
+
+    def __init__(self, bytes_per_second: Optional[float]):
+        self.rate = bytes_per_second
+        self._lock = threading.Lock()
+        self._available = 0.0
+        self._last = time.monotonic()
+
+    def consume(self, count: int) -> None:
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Allow at most a second's worth of burst
+            self._available = min(self.rate, self._available + (now - self._last) * self.rate)
+            self._last = now
+            self._available -= count
+            wait = -self._available / self.rate if self._available < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class _ThrottledFile:
+    """Read-only file wrapper that draws from a RateLimiter while requests streams it."""
+
+    def __init__(self, f, limiter: RateLimiter):
+        self._f = f
+        self._limiter = limiter
+        self.size = os.fstat(f.fileno()).st_size
+
+    def __len__(self) -> int:
+        return self.size  # requests subtracts tell() itself
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._limiter.consume(len(data))
+        return data
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._f.seek(offset, whence)
+
+
+class UploadQueue:
+    """
+    Durable upload queue in SQLite, drained by background workers.
+
+    Queued captures survive restarts and network outages. Failed attempts are
+    retried with jittered exponential backoff. Large files use resumable, chunked
+    uploads whose progress is stored, so a dropped connection resumes where the
+    server left off. A capture leaves gallery/local (moved to `uploaded_directory`,
+    or deleted with keep_uploaded=False) only after the server has acknowledged
+    the stored image. `workers` and `max_bytes_per_second` bound how much of the
+    Pi the queue can take from the preview loop.
+    """
+
+    def __init__(self, database: str = QUEUE_DATABASE, client: Optional[UploaderClient] = None, workers: int = 1,
+                 max_bytes_per_second: Optional[float] = None, uploaded_directory: str = UPLOADED_DIRECTORY,
+                 keep_uploaded: bool = True, chunk_size: int = CHUNK_SIZE,
+                 resumable_threshold: int = RESUMABLE_THRESHOLD, base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY, on_change=None):
+        self.client = client or UploaderClient(pool_size=workers)
+        self.workers = workers
+        self.limiter = RateLimiter(max_bytes_per_second)
+        self.uploaded_directory = uploaded_directory
+        self.keep_uploaded = keep_uploaded
+        self.chunk_size = chunk_size
+        self.resumable_threshold = resumable_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_change = on_change  # Called with (path, state) from worker threads
+
+        directory = os.path.dirname(database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+        # Anything caught mid-upload by a crash or power cut goes back in line
+        self._execute("UPDATE uploads SET state = 'pending' WHERE state = 'uploading'")
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _update(self, job_id: int, **fields) -> None:
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE uploads SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def enqueue(self, path: str) -> None:
+        """Queue a capture for upload; queuing the same path again retries it now."""
+        path = os.path.abspath(path)
+        now = time.time()
+        with self._wake:
+            self._db.execute(
+                "INSERT INTO uploads (path, created, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET state = 'pending', next_attempt = 0, updated = excluded.updated "
+                "WHERE state != 'uploading'", (path, now, now))
+            self._wake.notify()
+        self._notify(path, "pending")
+
+    def pending_paths(self) -> List[str]:
+        """Captures still waiting to be uploaded (including ones being uploaded right now)."""
+        rows = self._execute("SELECT path FROM uploads WHERE state IN ('pending', 'uploading')")
+        return [row[0] for row in rows]
+
+    def counts(self) -> dict:
+        return dict(self._execute("SELECT state, COUNT(*) FROM uploads GROUP BY state"))
+
+    def start(self) -> "UploadQueue":
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"upload-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers; an interrupted upload resumes on the next start."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.client.close()
+
+    def _notify(self, path: str, state: str) -> None:
+        if self.on_change is not None:
+            self.on_change(path, state)
+
+    def _claim(self) -> Optional[dict]:
+        """Atomically take the next due job, or wait until one is due."""
+        columns = ("id", "path", "attempts", "image_hash", "signature", "file_sha256", "metadata_sent",
+                   "upload_id", "bytes_sent")
+        with self._wake:
+            while not self._stopping:
+                now = time.time()
+                row = self._db.execute(
+                    f"SELECT {', '.join(columns)} FROM uploads WHERE state = 'pending' AND next_attempt <= ? "
+                    "ORDER BY next_attempt, id LIMIT 1", (now,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE uploads SET state = 'uploading', updated = ? WHERE id = ?", (now, row[0]))
+                    return dict(zip(columns, row))
+
+                # Sleep until the earliest retry is due (or a new capture is queued)
+                next_due = self._db.execute(
+                    "SELECT MIN(next_attempt) FROM uploads WHERE state = 'pending'").fetchone()[0]
+                self._wake.wait(None if next_due is None else max(0.0, next_due - now))
+        return None
+
+    def _run(self) -> None:
+        while True:
+            job = self._claim()
+            if job is None:
+                return
+            self._notify(job["path"], "uploading")
+            try:
+                uploaded_path = self._upload(job)
+            except PermanentUploadError as e:
+                self._update(job["id"], state="failed", last_error=str(e))
+                self._notify(job["path"], "failed")
+            except Exception as e:
+                attempts = job["attempts"] + 1
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                self._update(job["id"], state="pending", attempts=attempts, next_attempt=time.time() + delay,
+                             last_error=str(e))
+                self._notify(job["path"], "pending")
+            else:
+                self._update(job["id"], state="done", uploaded_path=uploaded_path, last_error=None)
+                self._notify(job["path"], "done")
+
+    def _upload(self, job: dict) -> str:
+        path = job["path"]
+        if not os.path.exists(path):
+            raise PermanentUploadError(f"{path} no longer exists")
+
+        if job["image_hash"] is None:
+            try:
+                image_hash, signature = prepare_signed(path)
+            except ValueError as e:
+                raise PermanentUploadError(str(e))
+            job.update(image_hash=image_hash.hex(), signature=signature, file_sha256=hash_file(path).hex())
+            self._update(job["id"], image_hash=job["image_hash"], signature=signature,
+                         file_sha256=job["file_sha256"])
+
+        if not job["metadata_sent"]:
+            response = self.client.send_metadata(bytes.fromhex(job["image_hash"]), job["signature"])
+            if not response.ok:
+                raise RuntimeError(f"Metadata rejected: {response.status_code} {response.text}")
+            self._update(job["id"], metadata_sent=1)
+
+        size = os.path.getsize(path)
+        acknowledgement = None
+        if size >= self.resumable_threshold:
+            acknowledgement = self._upload_resumable(job, path, size)
+        if acknowledgement is None:
+            with open(path, 'rb') as f:
+                response = self.client.store_image(_ThrottledFile(f, self.limiter))
+            if not response.ok:
+                raise RuntimeError(f"Image rejected: {response.status_code} {response.text}")
+            acknowledgement = response.json()
+
+        # Only an acknowledged, intact copy on the server lets the local file go
+        stored_hash = acknowledgement.get("sha256")
+        if stored_hash is not None and stored_hash != job["file_sha256"]:
+            self._update(job["id"], upload_id=None, bytes_sent=0)  # Start the next attempt from scratch
+            raise RuntimeError("Server stored a different image than was sent")
+
+        if not self.keep_uploaded:
+            os.remove(path)
+            return path
+        os.makedirs(self.uploaded_directory, exist_ok=True)
+        uploaded_path = os.path.join(self.uploaded_directory, f"done_{os.path.basename(path)}")
+        os.replace(path, uploaded_path)
+        return uploaded_path
+
+    def _upload_resumable(self, job: dict, path: str, size: int) -> Optional[dict]:
+        """Send the file in chunks from wherever the server left off; None if unsupported."""
+        upload_id = job["upload_id"]
+        if upload_id is None:
+            session = self.client.start_resumable(job["file_sha256"], size)
+            if session is None:
+                return None
+            upload_id, offset = session["upload_id"], session["received"]
+            self._update(job["id"], upload_id=upload_id)
+        else:
+            offset = self.client.resumable_status(upload_id)
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                data = f.read(self.chunk_size)
+                self.limiter.consume(len(data))
+                reply = self.client.send_chunk(upload_id, data, offset, size)
+                offset = reply["received"]
+                self._update(job["id"], bytes_sent=offset)
+                if offset >= size:
+                    return reply
+                f.seek(offset)
+
+    def close(self) -> None:
+        self.stop()
+        self._db.close()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_upload_queue(**kwargs) -> UploadQueue:
+    """
+    Process-wide queue, created and started on first use with `kwargs`.
+
+    Settings only apply when the queue is created, so passing any once it exists
+    raises instead of silently running with the first caller's configuration.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = UploadQueue(**kwargs).start()
+        elif kwargs:
+            raise RuntimeError("The upload queue already exists; configure it before its first use")
+        return _queue
@@ -0,0 +1,225 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from binascii import Error as HexError, unhexlify
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, List, Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+
+from imaging.hashing import hash_file
+from imaging.keys import PUBLIC_KEY_FILE_NAME, load_public_key
+from imaging.png import ChunkIndex, read_chunk_data
+
+SIGNATURE_KEY = 'Signature'
+HASH_MODE_KEY = 'HashMode'
+
+
+@dataclass
+class VerifyResult:
+    """Outcome of verifying one file."""
+    path: str
+    status: str = "pending"  # "valid", "invalid", "unsigned" or "error"
+    hash_mode: Optional[str] = None  # "file" or "canonical"
+    image_hash: Optional[str] = None
+    size: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class VerifyReport:
+    results: List[VerifyResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+    workers: int = 1
+
+    @property
+    def valid(self) -> List[VerifyResult]:
+        return [result for result in self.results if result.status == "valid"]
+
+    @property
+    def failed(self) -> List[VerifyResult]:
+        return [result for result in self.results if result.status != "valid"]
+
+    @property
+    def files_per_second(self) -> float:
+        return len(self.results) / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        total = sum(result.size for result in self.results)
+        return total / 1e6 / self.wall_seconds if self.wall_seconds else 0.0
+
+    def counts(self) -> dict:
+        counts = {}
+        for result in self.results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return counts
+
+    def to_dict(self) -> dict:
+        return {
+            "files": [asdict(result) for result in self.results],
+            "counts": self.counts(),
+            "workers": self.workers,
+            "wall_seconds": self.wall_seconds,
+            "files_per_second": self.files_per_second,
+            "megabytes_per_second": self.megabytes_per_second,
+        }
+
+    def print_summary(self) -> None:
+        for result in self.failed:
+            print(f"{result.status:<9}{result.path}" + (f"  ({result.error})" if result.error else ""))
+        counts = ", ".join(f"{count} {status}" for status, count in sorted(self.counts().items()))
+        print(f"\n{counts or 'no files'} in {self.wall_seconds:.2f}s with {self.workers} worker(s): "
+              f"{self.files_per_second:.1f} files/s, {self.megabytes_per_second:.1f} MB/s")
+
+
+def verify_png(path: str, public_key: rsa.RSAPublicKey) -> VerifyResult:
+    """
+    Verify the embedded signature of one TrueSight PNG.
+
+    Only the chunk headers and the Signature/HashMode tEXt payloads are read to
+    locate the signature; the hash is then streamed over the file around the
+    Signature chunk (or over the image-content chunks for canonical captures), so
+    no file is ever held in memory.
+    """
+    result = VerifyResult(path)
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            index = ChunkIndex.from_file(f)
+            result.size = index.file_size
+            signature_chunk = index.find_text(SIGNATURE_KEY)
+            if signature_chunk is None:
+                result.status = "unsigned"
+                return result
+            signature = read_chunk_data(f, signature_chunk)[len(SIGNATURE_KEY) + 1:]
+            hash_mode_chunk = index.find_text(HASH_MODE_KEY)
+            canonical = (hash_mode_chunk is not None
+                         and read_chunk_data(f, hash_mode_chunk).endswith(b'\x00canonical'))
+
+        result.hash_mode = "canonical" if canonical else "file"
+        image_hash = hash_file(path, canonical=canonical, skip=(signature_chunk.offset, signature_chunk.end))
+        result.image_hash = image_hash.hex()
+        public_key.verify(unhexlify(signature), image_hash, padding.PKCS1v15(), Prehashed(hashes.SHA256()))
+        result.status = "valid"
+    except (InvalidSignature, HexError) as e:
+        result.status = "invalid"
+        result.error = str(e) or "signature does not match"
+    except Exception as e:
+        result.status = "error"
+        result.error = str(e)
+    finally:
+        result.seconds = time.perf_counter() - start
+    return result
+
+
+# Each pool worker parses the public key once, in its initializer
+_worker_public_key = None
+
+
+def _init_worker(public_key_file: str) -> None:
+    global _worker_public_key
+    _worker_public_key = load_public_key(public_key_file)
+
+
+def _verify_in_worker(path: str) -> VerifyResult:
+    return verify_png(path, _worker_public_key)
+
+
+def verify_many(paths: Iterable[str], workers: Optional[int] = None,
+                public_key_file: str = PUBLIC_KEY_FILE_NAME) -> VerifyReport:
+    """
+    Verify many PNGs, spread over a process pool.
+
+    Hashing releases the GIL but RSA verification and chunk parsing do not, so
+    processes scale further than threads on large archives. Every worker loads the
+    public key once. With workers=1 everything runs in this process.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if workers == 1 or len(paths) <= 1:
+        public_key = load_public_key(public_key_file)
+        results = [verify_png(path, public_key) for path in paths]
+        workers = 1
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(public_key_file,)) as pool:
+            # Chunks of several files per task keep IPC overhead off small captures
+            chunksize = max(1, len(paths) // (workers * 4))
+            results = list(pool.map(_verify_in_worker, paths, chunksize=chunksize))
+    return VerifyReport(results, time.perf_counter() - start, workers)
+
+
+def _collect_paths(arguments: List[str]) -> List[str]:
+    paths = []
+    for path in arguments:
+        if os.path.isdir(path):
+            paths.extend(sorted(glob.glob(os.path.join(path, "**", "*.png"), recursive=True)))
+        else:
+            paths.append(path)
+    return paths
+
+
+def _benchmark(count=48, size=(720, 1280)):
+    """Files/s and MB/s for a few worker counts over freshly signed captures."""
+    import tempfile
+    import numpy as np
+    from imaging.artifact import write_artifact
+    from imaging.keys import key_manager
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (*size, 3), dtype=np.uint8)
+    directory = tempfile.mkdtemp()
+    private_key = key_manager.private_key()
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"frame_{i:04d}.png")
+        write_artifact(path, image, private_key=private_key, canonical=bool(i % 2))
+        paths.append(path)
+
+    print(f"{count} signed captures of {size[1]}x{size[0]}\n")
+    print(f"{'workers':>8}{'files/s':>10}{'MB/s':>8}{'valid':>8}")
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        report = verify_many(paths, workers)
+        print(f"{workers:>8}{report.files_per_second:>10.1f}{report.megabytes_per_second:>8.1f}"
+              f"{len(report.valid):>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify the signatures of TrueSight PNG captures.")
+    parser.add_argument("paths", nargs="*", help="PNG files or directories (searched recursively)")
+    parser.add_argument("--workers", type=int, help="Verifier processes (default: one per CPU)")
+    parser.add_argument("--public-key", default=PUBLIC_KEY_FILE_NAME)
+    parser.add_argument("--json", metavar="FILE", help="Write the report as JSON ('-' for stdout)")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark on generated captures")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        _benchmark()
+        return 0
+    if not args.paths:
+        parser.error("no files or directories given")
+
+    report = verify_many(_collect_paths(args.paths), args.workers, args.public_key)
+    if args.json == "-":
+        json.dump(report.to_dict(), sys.stdout, indent=2)
+        print()
+    else:
+        report.print_summary()
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report.to_dict(), f, indent=2)
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
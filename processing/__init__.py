@@ -0,0 +1,3 @@
+from .scheduler import Job, JobState, ProcessingScheduler, QueuePolicy
+
+__all__ = ["Job", "JobState", "ProcessingScheduler", "QueuePolicy"]
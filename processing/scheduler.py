@@ -0,0 +1,194 @@
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+
+
+class JobState(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    REJECTED = "rejected"    # Queue was full and the policy is "reject"
+    COALESCED = "coalesced"  # Dropped for a newer job while still queued
+
+
+class QueuePolicy(Enum):
+    REJECT = "reject"      # Refuse new jobs while the queue is full
+    COALESCE = "coalesce"  # Drop the oldest queued job; only for work that can be redone
+
+
+class Job:
+    """A unit of post-capture work and its lifecycle timestamps."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name, fn, args, kwargs):
+        self.id = next(Job._ids)
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+        self.state = JobState.QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state not in (JobState.QUEUED, JobState.RUNNING)
+
+    def __repr__(self):
+        return f"Job({self.id}, {self.name!r}, {self.state.value})"
+
+
+class ProcessingScheduler:
+    """
+    Bounded job queue drained by a fixed pool of workers.
+
+    Workers are threads; with mode="process" each one hands its job to a shared
+    ProcessPoolExecutor so CPU-heavy work runs outside the GUI process. Such jobs
+    must be self-contained: a picklable module-level function that relies on no
+    state set up at runtime in the submitting process. At most
+    `max_queue` jobs wait at a time, and `policy` decides what happens when a new
+    job arrives while the queue is full. Callers that must not lose work should
+    check is_full() before producing it and keep the default REJECT policy.
+    """
+
+    def __init__(self, workers=1, max_queue=2, policy=QueuePolicy.REJECT, mode="thread",
+                 on_state_change=None, history=32):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode: {mode}")
+
+        self.workers = workers
+        self.max_queue = max_queue
+        self.policy = QueuePolicy(policy)
+        self.mode = mode
+        self.on_state_change = on_state_change
+
+        self._queue = deque()
+        self._active = []
+        self._history = deque(maxlen=history)
+        self._condition = threading.Condition()
+        self._running = True
+
+        self._executor = ProcessPoolExecutor(max_workers=workers) if mode == "process" else None
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"processing-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, name=None, **kwargs) -> Job:
+        """Queue fn(*args, **kwargs). The returned job may already be REJECTED."""
+        job = Job(name or fn.__name__, fn, args, kwargs)
+        dropped = None
+
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Scheduler has been shut down")
+
+            if len(self._queue) >= self.max_queue:
+                if self.policy == QueuePolicy.REJECT:
+                    job.state = JobState.REJECTED
+                    job.finished_at = time.time()
+                    self._history.append(job)
+                else:
+                    dropped = self._queue.popleft()
+                    dropped.state = JobState.COALESCED
+                    dropped.finished_at = time.time()
+                    self._history.append(dropped)
+
+            if job.state == JobState.QUEUED:
+                self._queue.append(job)
+                # wait_idle() shares this condition, so a single notify could wake
+                # it instead of an idle worker
+                self._condition.notify_all()
+
+        if dropped is not None:
+            self._notify(dropped)
+        self._notify(job)
+        return job
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                job = self._queue.popleft()
+                job.state = JobState.RUNNING
+                job.started_at = time.time()
+                self._active.append(job)
+
+            self._notify(job)
+
+            try:
+                if self._executor is not None:
+                    job.result = self._executor.submit(job.fn, *job.args, **job.kwargs).result()
+                else:
+                    job.result = job.fn(*job.args, **job.kwargs)
+                job.state = JobState.DONE
+            except Exception as e:
+                job.error = e
+                job.state = JobState.FAILED
+                print(f"Error: job {job.name} failed: {e}")
+
+            job.finished_at = time.time()
+            with self._condition:
+                self._active.remove(job)
+                self._history.append(job)
+                self._condition.notify_all()
+
+            self._notify(job)
+
+    def _notify(self, job):
+        if self.on_state_change is not None:
+            try:
+                self.on_state_change(job)
+            except Exception as e:
+                print(f"Error in job state callback: {e}")
+
+    def jobs(self) -> list:
+        """Snapshot of recently finished, running and queued jobs (oldest first)."""
+        with self._condition:
+            return list(self._history) + list(self._active) + list(self._queue)
+
+    def is_full(self) -> bool:
+        """True while a new job would be rejected (or coalesce a queued one)."""
+        with self._condition:
+            return len(self._queue) >= self.max_queue
+
+    def summary(self) -> dict:
+        """Count of queued and running jobs, for status displays."""
+        with self._condition:
+            return {"queued": len(self._queue), "running": len(self._active)}
+
+    def wait_idle(self, timeout=None) -> bool:
+        """Block until no job is queued or running."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs; workers finish what is already queued."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from depth import DepthQuantizer
+
+
+@pytest.fixture
+def quantizer():
+    return DepthQuantizer(0.3, 10.0, dtype=np.uint16)
+
+
+@pytest.fixture
+def depth_codes(quantizer):
+    """Smooth uint16 depth with holes, at a size that leaves partial tiles and odd pyramid blocks."""
+    rng = np.random.default_rng(0)
+    height, width = 203, 317
+    y, x = np.mgrid[0:height, 0:width]
+    depth = 0.5 + 4.0 * (x / width) + 2.0 * np.sin(y / 17.0) ** 2
+    valid = rng.random((height, width)) > 0.2
+    return quantizer.quantize(depth.astype(np.float32), valid)
@@ -0,0 +1,93 @@
+import functools
+
+import numpy as np
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import imaging.artifact
+from imaging.artifact import write_artifact
+from imaging.depth_chunk import (DEPTH_CHUNK_TYPE, DEPTH_LEVEL_CHUNK_TYPE, encode_depth_chunk,
+                                 encode_depth_pyramid, read_depth_chunk, read_depth_preview, split_depth_payload)
+from imaging.png import get_chunk_index
+from imaging.verify import verify_png
+
+
+@pytest.fixture(scope="module")
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def image(depth_codes):
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 256, (*depth_codes.shape, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("canonical", [False, True])
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_signed_artifact_round_trip(tmp_path, image, depth_codes, quantizer, private_key, canonical, use_mmap):
+    path = str(tmp_path / "capture.png")
+    payload = encode_depth_chunk(depth_codes, quantizer, tile_size=64)
+
+    image_hash, signature = write_artifact(path, image, payload, {"DepthPreset": "balanced"}, private_key,
+                                           canonical=canonical)
+
+    header, codes = read_depth_chunk(path, use_mmap=use_mmap)
+    np.testing.assert_array_equal(codes, depth_codes)
+    assert header.near == pytest.approx(quantizer.near)
+
+    result = verify_png(path, private_key.public_key())
+    assert result.status == "valid"
+    assert result.image_hash == image_hash.hex()
+    assert result.hash_mode == ("canonical" if canonical else "file")
+    assert get_chunk_index(path).find_text("DepthPreset") is not None
+    assert not (tmp_path / "capture.png.part").exists()
+
+
+def test_unsigned_artifact(tmp_path, image, depth_codes, quantizer, private_key):
+    path = str(tmp_path / "capture.png")
+
+    _, signature = write_artifact(path, image, encode_depth_chunk(depth_codes, quantizer))
+
+    assert signature is None
+    assert verify_png(path, private_key.public_key()).status == "unsigned"
+
+
+def test_tampered_artifact_fails(tmp_path, image, depth_codes, quantizer, private_key):
+    path = tmp_path / "capture.png"
+    write_artifact(str(path), image, encode_depth_chunk(depth_codes, quantizer), private_key=private_key)
+
+    data = bytearray(path.read_bytes())
+    depth_chunk = get_chunk_index(str(path)).find(DEPTH_CHUNK_TYPE)
+    data[depth_chunk.data_offset + 40] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    assert verify_png(str(path), private_key.public_key()).status == "invalid"
+
+
+def test_depth_split_over_chunks(tmp_path, monkeypatch, image, depth_codes, quantizer):
+    monkeypatch.setattr(imaging.artifact, "split_depth_payload",
+                        functools.partial(split_depth_payload, max_size=4096))
+    path = str(tmp_path / "capture.png")
+    payload = encode_depth_chunk(depth_codes, quantizer, tile_size=64)
+
+    write_artifact(path, image, payload)
+
+    assert len(get_chunk_index(path).find_all(DEPTH_CHUNK_TYPE)) == -(-len(payload) // 4096)
+    np.testing.assert_array_equal(read_depth_chunk(path)[1], depth_codes)
+
+
+def test_depth_levels_and_preview(tmp_path, image, depth_codes, quantizer):
+    path = str(tmp_path / "capture.png")
+    levels = encode_depth_pyramid(depth_codes, quantizer, levels=3)
+
+    write_artifact(path, image, encode_depth_chunk(depth_codes, quantizer), depth_levels=levels)
+
+    assert len(get_chunk_index(path).find_all(DEPTH_LEVEL_CHUNK_TYPE)) == 3
+    height, width = depth_codes.shape
+    # The smallest level that still covers the request is chosen
+    header, codes = read_depth_preview(path, width // 8, height // 8)
+    assert codes.shape == (-(-height // 8), -(-width // 8))
+    # Nothing stored is large enough, so the full map is decoded
+    _, codes = read_depth_preview(path, width, height)
+    np.testing.assert_array_equal(codes, depth_codes)
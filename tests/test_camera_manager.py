@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+
+from camera import CameraManager, FakeCapture
+
+TEST_IMAGES = os.path.join(os.path.dirname(__file__), os.pardir, "test_images")
+
+
+@pytest.fixture
+def fakes():
+    return {
+        0: FakeCapture.from_files([os.path.join(TEST_IMAGES, "right_image.png")], fps=60.0),
+        2: FakeCapture.from_stereo_pairs(TEST_IMAGES, fps=60.0),
+    }
+
+
+@pytest.fixture
+def manager(fakes):
+    manager = CameraManager({"preview": 0, "stereo": 2}, open_capture=lambda index: fakes[index]).open()
+    yield manager
+    manager.release()
+
+
+def test_stills_while_preview_runs(manager, fakes):
+    stream = manager.preview_stream("preview")
+    try:
+        assert stream.wait_ready(timeout=5.0)
+
+        stereo = fakes[2].frames
+        for _ in range(3):
+            frame = manager.capture_still("stereo")
+            assert frame is not None
+            assert frame.shape == stereo[0].shape  # Side-by-side halves
+            # The preview keeps producing frames between stills
+            assert stream.is_alive()
+
+        time.sleep(0.1)
+        assert stream.latest() is not None
+        assert stream.stats()["failed_reads"] == 0
+    finally:
+        stream.stop()
+
+
+def test_still_stats(manager):
+    assert manager.stats()["stereo"]["shots"] == 0
+
+    manager.capture_still("stereo")
+    first = manager.stats()["stereo"]
+    assert first["shots"] == 1
+    assert first["capture_ms"] > 0
+    assert first["shot_to_shot_ms"] == 0  # No previous shot yet
+
+    manager.capture_still("stereo")
+    second = manager.stats()["stereo"]
+    assert second["shots"] == 2
+    assert second["failures"] == 0
+    assert second["shot_to_shot_ms"] > 0
+    assert second["avg_capture_ms"] > 0
+
+
+def test_still_from_closed_device_is_a_failure(fakes):
+    manager = CameraManager({"stereo": 2}, open_capture=lambda index: fakes[index]).open()
+    fakes[2].release()
+
+    # A closed fake cannot be reopened, so the still fails and is counted
+    assert manager.capture_still("stereo") is None
+    assert manager.stats()["stereo"]["failures"] == 1
@@ -0,0 +1,115 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from depth import DepthQuantizer
+from imaging.depth_chunk import (CODECS, DEPTH_CHUNK_VERSION, FLAG_BYTE_PLANES, FLAG_TILED, HEADER_FORMAT,
+                                 HEADER_SIZE, DepthChunkHeader, decode_depth_chunk, decode_legacy_depth_chunk,
+                                 encode_depth_chunk, is_versioned, split_depth_payload)
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+@pytest.mark.parametrize("filter", ["none", "sub", "up"])
+@pytest.mark.parametrize("byte_planes", [False, True])
+def test_round_trip(depth_codes, quantizer, codec, filter, byte_planes):
+    payload = encode_depth_chunk(depth_codes, quantizer, filter, codec, byte_planes=byte_planes)
+    header, codes = decode_depth_chunk(payload)
+
+    np.testing.assert_array_equal(codes, depth_codes)
+    assert codes.dtype == depth_codes.dtype
+    assert (header.filter, header.codec) == (filter, codec)
+    assert bool(header.flags & FLAG_BYTE_PLANES) == byte_planes
+
+
+def test_uint8_round_trip(depth_codes):
+    codes8 = (depth_codes >> 8).astype(np.uint8)
+    payload = encode_depth_chunk(codes8, DepthQuantizer(0.3, 10.0, dtype=np.uint8), byte_planes=True)
+    header, codes = decode_depth_chunk(payload)
+
+    np.testing.assert_array_equal(codes, codes8)
+    assert not header.flags & FLAG_BYTE_PLANES  # Byte planes only apply to uint16
+
+
+def test_header_records_quantizer(depth_codes, quantizer):
+    header, _ = decode_depth_chunk(encode_depth_chunk(depth_codes, quantizer))
+
+    assert (header.width, header.height) == (depth_codes.shape[1], depth_codes.shape[0])
+    assert header.near == pytest.approx(quantizer.near)
+    assert header.far == pytest.approx(quantizer.far)
+    assert header.scale == pytest.approx(quantizer.scale)
+    assert (header.min_code, header.invalid_value) == (quantizer.min_code, quantizer.invalid_value)
+
+    metres = header.to_metres(np.array([[quantizer.invalid_value, quantizer.min_code]], dtype=np.uint16))
+    assert np.isnan(metres[0, 0])
+    assert metres[0, 1] == pytest.approx(quantizer.near)
+
+
+def test_header_versions(depth_codes, quantizer):
+    untiled = DepthChunkHeader.unpack(encode_depth_chunk(depth_codes, quantizer))
+    tiled = DepthChunkHeader.unpack(encode_depth_chunk(depth_codes, quantizer, tile_size=64))
+
+    # Untiled payloads keep version 1 so older readers can still decode them
+    assert (untiled.version, untiled.flags & FLAG_TILED) == (1, 0)
+    assert (tiled.version, tiled.flags & FLAG_TILED) == (DEPTH_CHUNK_VERSION, FLAG_TILED)
+
+
+def test_header_pack_unpack(quantizer):
+    header = DepthChunkHeader(640, 480, np.dtype(np.uint16), quantizer.scale, quantizer.offset, quantizer.near,
+                              quantizer.far, quantizer.min_code, quantizer.invalid_value, "up", "zlib", FLAG_TILED)
+    packed = header.pack()
+
+    assert len(packed) == HEADER_SIZE
+    assert is_versioned(packed)
+    unpacked = DepthChunkHeader.unpack(packed)
+    # Range fields are stored as float32
+    assert unpacked.near == pytest.approx(header.near)
+    assert unpacked.scale == pytest.approx(header.scale)
+    assert unpacked._replace(scale=header.scale, offset=header.offset, near=header.near,
+                             far=header.far) == header
+
+
+def test_newer_version_is_rejected(depth_codes, quantizer):
+    payload = bytearray(encode_depth_chunk(depth_codes, quantizer))
+    payload[2] = DEPTH_CHUNK_VERSION + 1
+
+    with pytest.raises(ValueError, match="Unsupported depth chunk version"):
+        decode_depth_chunk(bytes(payload))
+
+
+def test_unknown_codec_is_rejected(depth_codes, quantizer):
+    payload = bytearray(encode_depth_chunk(depth_codes, quantizer))
+    fields = list(struct.unpack_from(HEADER_FORMAT, payload))
+    fields[4] = 0xFF  # Codec id
+    struct.pack_into(HEADER_FORMAT, payload, 0, *fields)
+
+    with pytest.raises(ValueError, match="codec"):
+        decode_depth_chunk(bytes(payload))
+
+
+def test_size_mismatch_is_rejected(depth_codes, quantizer):
+    payload = encode_depth_chunk(depth_codes, quantizer)
+    truncated = payload[:HEADER_SIZE] + zlib.compress(zlib.decompress(payload[HEADER_SIZE:])[:-2])
+
+    with pytest.raises(ValueError, match="does not match"):
+        decode_depth_chunk(truncated)
+
+
+def test_legacy_chunk():
+    codes = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    data = zlib.compress(codes.tobytes())
+
+    assert not is_versioned(data)
+    np.testing.assert_array_equal(decode_legacy_depth_chunk(data, 4, 3), codes)
+    with pytest.raises(ValueError):
+        decode_legacy_depth_chunk(data, 5, 3)
+
+
+def test_split_depth_payload():
+    payload = bytes(range(256)) * 10
+
+    pieces = split_depth_payload(payload, max_size=1000)
+    assert [len(piece) for piece in pieces] == [1000, 1000, 560]
+    assert b"".join(pieces) == payload
+    assert split_depth_payload(b"") == [b""]
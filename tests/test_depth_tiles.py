@@ -0,0 +1,137 @@
+import functools
+
+import numpy as np
+import pytest
+
+import imaging.artifact
+import imaging.depth_chunk
+from imaging.artifact import write_artifact
+from imaging.depth_chunk import (FLAG_TILED, HEADER_SIZE, TileLayout, build_depth_pyramid, decode_depth_chunk,
+                                 encode_depth_chunk, read_depth_region, split_depth_payload)
+
+RECTS = [
+    (0, 0, 317, 203),   # Whole map
+    (10, 20, 30, 40),   # Inside one tile
+    (50, 50, 100, 90),  # Across tile boundaries
+    (300, 190, 64, 64),  # Clipped at the bottom-right partial tiles
+    (-10, -10, 20, 20),  # Clipped at the origin
+]
+
+
+@pytest.mark.parametrize("tile_size", [16, 64, 100, 512])
+@pytest.mark.parametrize("filter", ["none", "sub", "up"])
+def test_tiled_round_trip(depth_codes, quantizer, tile_size, filter):
+    payload = encode_depth_chunk(depth_codes, quantizer, filter, tile_size=tile_size, byte_planes=True)
+    header, codes = decode_depth_chunk(payload)
+
+    assert header.flags & FLAG_TILED
+    np.testing.assert_array_equal(codes, depth_codes)
+
+
+def test_tile_layout(depth_codes, quantizer):
+    payload = encode_depth_chunk(depth_codes, quantizer, tile_size=64)
+    header, _ = decode_depth_chunk(payload)
+    layout = TileLayout.unpack(header, payload)
+
+    assert (layout.tile_width, layout.tile_height) == (64, 64)
+    assert (layout.columns, layout.rows) == (5, 4)  # 317 x 203 leaves partial tiles on both edges
+    assert layout.offsets[0] == 0
+    assert np.all(np.diff(layout.offsets) > 0)
+    assert HEADER_SIZE + layout.table_size + layout.offsets[-1] == len(payload)
+    assert list(layout.tiles_in(60, 0, 10, 70)) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+
+@pytest.fixture
+def tiled_capture(tmp_path, depth_codes, quantizer):
+    path = str(tmp_path / "tiled.png")
+    image = np.zeros((*depth_codes.shape, 3), dtype=np.uint8)
+    write_artifact(path, image, encode_depth_chunk(depth_codes, quantizer, tile_size=64))
+    return path
+
+
+@pytest.mark.parametrize("rect", RECTS)
+def test_region_read(tiled_capture, depth_codes, rect):
+    x, y, width, height = rect
+    left, top = max(0, x), max(0, y)
+
+    header, region = read_depth_region(tiled_capture, rect)
+
+    np.testing.assert_array_equal(region, depth_codes[top:y + height, left:x + width])
+    assert header.width == depth_codes.shape[1]
+
+
+def test_region_read_inflates_only_intersecting_tiles(tiled_capture, monkeypatch):
+    calls = []
+    decode_block = imaging.depth_chunk._decode_block
+
+    def counting_decode_block(*args):
+        calls.append(args)
+        return decode_block(*args)
+
+    monkeypatch.setattr(imaging.depth_chunk, "_decode_block", counting_decode_block)
+    read_depth_region(tiled_capture, (50, 50, 100, 70))
+
+    assert len(calls) == 6  # Columns 0-2 of rows 0-1 out of a 5 x 4 grid
+
+
+@pytest.mark.parametrize("rect", RECTS)
+def test_region_read_untiled_fallback(tmp_path, depth_codes, quantizer, rect):
+    path = str(tmp_path / "untiled.png")
+    write_artifact(path, np.zeros((*depth_codes.shape, 3), dtype=np.uint8), encode_depth_chunk(depth_codes, quantizer))
+    x, y, width, height = rect
+
+    _, region = read_depth_region(path, rect)
+
+    np.testing.assert_array_equal(region, depth_codes[max(0, y):y + height, max(0, x):x + width])
+
+
+@pytest.mark.parametrize("rect", RECTS)
+def test_region_read_across_split_chunks(tmp_path, monkeypatch, depth_codes, quantizer, rect):
+    monkeypatch.setattr(imaging.artifact, "split_depth_payload",
+                        functools.partial(split_depth_payload, max_size=1500))
+    path = str(tmp_path / "split.png")
+    write_artifact(path, np.zeros((*depth_codes.shape, 3), dtype=np.uint8),
+                   encode_depth_chunk(depth_codes, quantizer, tile_size=64))
+    x, y, width, height = rect
+
+    _, region = read_depth_region(path, rect)
+
+    np.testing.assert_array_equal(region, depth_codes[max(0, y):y + height, max(0, x):x + width])
+
+
+def _block_means(codes, factor, invalid_value):
+    """Brute-force reference: rounded mean of the valid pixels in each factor x factor block."""
+    height, width = -(-codes.shape[0] // factor), -(-codes.shape[1] // factor)
+    expected = np.full((height, width), invalid_value, dtype=codes.dtype)
+    for row in range(height):
+        for column in range(width):
+            block = codes[row * factor:(row + 1) * factor, column * factor:(column + 1) * factor]
+            values = block[block != invalid_value]
+            if values.size:
+                expected[row, column] = np.rint(values.astype(np.float64).mean())
+    return expected
+
+
+def test_pyramid_levels_match_block_means(depth_codes, quantizer):
+    pyramid = build_depth_pyramid(depth_codes, quantizer.invalid_value, levels=3)
+
+    assert len(pyramid) == 3
+    for level, reduced in enumerate(pyramid, start=1):
+        np.testing.assert_array_equal(reduced, _block_means(depth_codes, 2 ** level, quantizer.invalid_value))
+
+
+def test_pyramid_keeps_empty_blocks_invalid():
+    codes = np.zeros((8, 8), dtype=np.uint16)
+    codes[:2, :2] = [[100, 0], [0, 103]]
+
+    half, quarter, eighth = build_depth_pyramid(codes, invalid_value=0, levels=3)
+
+    assert half[0, 0] == 102  # Mean of the two valid pixels, not diluted by the holes
+    assert np.count_nonzero(half) == 1
+    assert quarter[0, 0] == eighth[0, 0] == 102
+
+
+def test_pyramid_stops_at_one_pixel():
+    levels = build_depth_pyramid(np.ones((3, 3), dtype=np.uint16), levels=5)
+
+    assert [level.shape for level in levels] == [(2, 2), (1, 1)]
@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import imaging.send_to_db
+from imaging.keys import KeyManager
+from imaging.send_to_db import UploaderClient
+from imaging.standin_server import StandInServer
+
+UPLOADS = 5
+
+
+@pytest.fixture(autouse=True)
+def signing_key(tmp_path, monkeypatch):
+    """A throwaway key, so the username signature does not need the device's shadow/ keys."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path = tmp_path / "private_key.pem"
+    path.write_bytes(private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                               serialization.NoEncryption()))
+    monkeypatch.setattr(imaging.send_to_db, "key_manager", KeyManager(str(path), None))
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = tmp_path / "capture.png"
+    path.write_bytes(os.urandom(3 * 1024 * 1024 + 17))
+    return str(path), hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+@pytest.fixture
+def server():
+    with StandInServer() as server:
+        yield server
+
+
+@pytest.mark.parametrize("combined", [False, True])
+def test_uploads_reuse_one_connection(server, capture, combined):
+    path, file_sha256 = capture
+
+    with UploaderClient(server.base_url, combined=combined) as client:
+        for _ in range(UPLOADS):
+            response, upload_response = client.upload(bytes(32), "00" * 256, path)
+            assert response.ok and upload_response.ok
+            # The image arrives intact, whether streamed alone or inside the multipart body
+            assert upload_response.json()["sha256"] == file_sha256
+
+    assert server.connections == 1
+    if combined:
+        assert server.requests == {"/api/image": UPLOADS}
+    else:
+        assert server.requests == {"/api/image": UPLOADS, "/api/store_image": UPLOADS}
+
+
+def test_store_image_streams_file_intact(server, capture):
+    path, file_sha256 = capture
+
+    with UploaderClient(server.base_url) as client:
+        response = client.store_image(path)
+
+    assert response.json() == {"status": "stored", "sha256": file_sha256}
+    assert server.bytes_received == os.path.getsize(path)
+
+
+def test_resumable_upload_resumes(server, capture):
+    path, file_sha256 = capture
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    with UploaderClient(server.base_url) as client:
+        session = client.start_resumable(file_sha256, size)
+        client.send_chunk(session["upload_id"], data[:1024 * 1024], 0, size)
+
+        # A new session for the same file picks up where the first one stopped
+        again = client.start_resumable(file_sha256, size)
+        assert again == {"upload_id": session["upload_id"], "received": 1024 * 1024}
+        assert client.resumable_status(session["upload_id"]) == 1024 * 1024
+
+        reply = client.send_chunk(session["upload_id"], data[1024 * 1024:], 1024 * 1024, size)
+
+    assert reply["sha256"] == file_sha256
+    assert server.connections == 1